@@ -14,7 +14,21 @@ from . import commons, utils
 from .download_utils import load_or_download_config, load_or_download_model
 from .mel_processing import spectrogram_torch, spectrogram_torch_conv
 from .models import SynthesizerTrn
-from .split_utils import split_sentence
+from .split_utils import iter_sentences, make_length_batches, pack_pieces, split_sentence
+
+PHONEME_INPUT_FIELDS = ("phones", "tones", "word2ph", "bert", "ja_bert", "norm_text")
+
+
+def pad_bert_stream(feats, dim):
+    """Pad ``[dim, t]`` features of a batch along time; None when no item has the stream."""
+    if all(f is None for f in feats):
+        return None
+    feats = [torch.zeros(dim, 0) if f is None else f for f in feats]
+    lengths = [f.size(-1) for f in feats]
+    padded = torch.zeros(len(feats), dim, max(lengths))
+    for i, f in enumerate(feats):
+        padded[i, :, :f.size(-1)] = f
+    return padded
 
 
 class TTS(nn.Module):
@@ -55,8 +69,13 @@ class TTS(nn.Module):
         checkpoint_dict = load_or_download_model(language, device, use_hf=use_hf, ckpt_path=ckpt_path)
         self.model.load_state_dict(checkpoint_dict['model'], strict=True)
 
+        self.language = self.text_language(language)
+
+    @staticmethod
+    def text_language(language):
+        """Frontend language of a model language, e.g. ``EN_V2 -> EN``."""
         language = language.split('_')[0]
-        self.language = 'ZH_MIX_EN' if language == 'ZH' else language  # we support a ZH_MIX_EN model
+        return 'ZH_MIX_EN' if language == 'ZH' else language  # we support a ZH_MIX_EN model
 
     @staticmethod
     def audio_numpy_concat(segment_data_list, sr, speed=1.):
@@ -68,14 +87,201 @@ class TTS(nn.Module):
         return audio_segments
 
     @staticmethod
-    def split_sentences_into_pieces(text, language, quiet=False):
+    def split_sentences_into_pieces(text, language, quiet=False, target_phones=None):
         texts = split_sentence(text, language_str=language)
+        if target_phones:
+            # merge/split the pieces toward a phone budget so batched inference pads less
+            from .text.cleaner import clean_text
+            texts = pack_pieces(
+                texts,
+                lambda t: len(clean_text(t, language)[1]),
+                target_phones=target_phones,
+                language_str=language)
         if not quiet:
             print(" > Text split to sentences.")
             print('\n'.join(texts))
             print(" > ===========================")
         return texts
 
+    def synthesize_piece(
+        self,
+        text,
+        speaker_id,
+        sdp_ratio=0.2,
+        noise_scale=0.6,
+        noise_scale_w=0.8,
+        speed=1.0,
+    ):
+        """Audio of a single sentence piece as a float32 numpy array."""
+        language = self.language
+        if language in ['EN', 'ZH_MIX_EN']:
+            text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
+        inputs = utils.get_text_for_tts_infer(text, language, self.hps, self.device, self.symbol_to_id)
+        return self._infer_batch([inputs], speaker_id, sdp_ratio, noise_scale, noise_scale_w, speed)[0]
+
+    def _infer_batch(self, inputs, speaker_id, sdp_ratio, noise_scale, noise_scale_w, speed):
+        """Run the acoustic model on a padded batch of ``(bert, ja_bert, phones, tones, lang_ids)`` inputs."""
+        device = self.device
+        berts, ja_berts, phones, tones, lang_ids = zip(*inputs)
+        with torch.no_grad():
+            x_tst = nn.utils.rnn.pad_sequence(phones, batch_first=True).to(device)
+            tones = nn.utils.rnn.pad_sequence(tones, batch_first=True).to(device)
+            lang_ids = nn.utils.rnn.pad_sequence(lang_ids, batch_first=True).to(device)
+            # only the streams the language uses are built; None is read by the model as zero features
+            bert = pad_bert_stream(berts, 1024)
+            ja_bert = pad_bert_stream(ja_berts, 768)
+            bert = bert.to(device) if bert is not None else None
+            ja_bert = ja_bert.to(device) if ja_bert is not None else None
+            x_tst_lengths = torch.LongTensor([p.size(0) for p in phones]).to(device)
+            speakers = torch.LongTensor([speaker_id] * len(phones)).to(device)
+            o, _, y_mask, _ = self.model.infer(
+                x_tst,
+                x_tst_lengths,
+                speakers,
+                tones,
+                lang_ids,
+                bert,
+                ja_bert,
+                sdp_ratio=sdp_ratio,
+                noise_scale=noise_scale,
+                noise_scale_w=noise_scale_w,
+                length_scale=1. / speed,
+            )
+            # trim each waveform to its own frame count
+            frames = o.size(-1) // y_mask.size(-1)
+            y_lengths = y_mask.sum([1, 2]).long().tolist()
+            audios = [o[i, 0, :n * frames].data.cpu().float().numpy() for i, n in enumerate(y_lengths)]
+            del x_tst, tones, lang_ids, bert, ja_bert, x_tst_lengths, speakers, o, y_mask
+        return audios
+
+    def _phoneme_inputs(self, item):
+        if not isinstance(item, dict):
+            item = dict(zip(PHONEME_INPUT_FIELDS, item))
+        return utils.get_text_from_phonemes(
+            item["phones"],
+            item["tones"],
+            item["word2ph"],
+            self.language,
+            self.hps,
+            self.device,
+            self.symbol_to_id,
+            bert=item.get("bert"),
+            ja_bert=item.get("ja_bert"),
+            norm_text=item.get("norm_text"),
+        )
+
+    def synthesize_phonemes(
+        self,
+        phones,
+        tones,
+        word2ph,
+        speaker_id,
+        bert=None,
+        ja_bert=None,
+        norm_text=None,
+        sdp_ratio=0.2,
+        noise_scale=0.6,
+        noise_scale_w=0.8,
+        speed=1.0,
+    ):
+        """Audio of a precomputed frontend result (``clean_text`` output), skipping normalization and G2P.
+
+        Phone symbols are checked against the model's symbols. ``bert``/``ja_bert`` are optional precomputed
+        features aligned to the model sequence; without them BERT runs on ``norm_text`` when given.
+        """
+        inputs = self._phoneme_inputs((phones, tones, word2ph, bert, ja_bert, norm_text))
+        return self._infer_batch([inputs], speaker_id, sdp_ratio, noise_scale, noise_scale_w, speed)[0]
+
+    def synthesize_phonemes_batch(
+        self,
+        items,
+        speaker_id,
+        sdp_ratio=0.2,
+        noise_scale=0.6,
+        noise_scale_w=0.8,
+        speed=1.0,
+        max_batch_size=16,
+    ):
+        """``synthesize_phonemes`` over many utterances, run as padded batches of similar length.
+
+        Each item is a dict with the ``PHONEME_INPUT_FIELDS`` keys (``phones``, ``tones`` and ``word2ph``
+        required) or a tuple in that order. Returns the audios in input order.
+        """
+        inputs = [self._phoneme_inputs(item) for item in items]
+        return self.synthesize_batch(
+            inputs, speaker_id, sdp_ratio, noise_scale, noise_scale_w, speed, max_batch_size=max_batch_size)
+
+    def synthesize_batch(
+        self,
+        inputs,
+        speaker_id,
+        sdp_ratio=0.2,
+        noise_scale=0.6,
+        noise_scale_w=0.8,
+        speed=1.0,
+        max_batch_size=16,
+    ):
+        """Audios of prepared ``(bert, ja_bert, phones, tones, lang_ids)`` inputs, in input order."""
+        audios = [None] * len(inputs)
+        for batch in make_length_batches([x[2].size(0) for x in inputs], max_batch_size=max_batch_size):
+            batch_audios = self._infer_batch([inputs[i] for i in batch], speaker_id, sdp_ratio, noise_scale,
+                                             noise_scale_w, speed)
+            for i, audio in zip(batch, batch_audios):
+                audios[i] = audio
+        return audios
+
+    def tts_iter(
+        self,
+        source,
+        speaker_id,
+        sdp_ratio=0.2,
+        noise_scale=0.6,
+        noise_scale_w=0.8,
+        speed=1.0,
+        chunk_size=65536,
+    ):
+        """Yield the audio of each sentence piece of ``source`` (a text, file object or iterable of strings)
+        as soon as it is synthesized, each followed by the same short silence as ``tts_to_file``."""
+        silence = np.zeros(int((self.hps.data.sampling_rate * 0.05) / speed), dtype=np.float32)
+        for t in iter_sentences(source, language_str=self.language, chunk_size=chunk_size):
+            audio = self.synthesize_piece(
+                t,
+                speaker_id,
+                sdp_ratio=sdp_ratio,
+                noise_scale=noise_scale,
+                noise_scale_w=noise_scale_w,
+                speed=speed,
+            )
+            yield np.concatenate([audio.reshape(-1), silence])
+
+    def tts_stream_to_file(
+        self,
+        source,
+        speaker_id,
+        output_path,
+        sdp_ratio=0.2,
+        noise_scale=0.6,
+        noise_scale_w=0.8,
+        speed=1.0,
+        format=None,
+        quiet=False,
+        chunk_size=65536,
+    ):
+        """Synthesize book-length input piece by piece, appending to ``output_path`` as it goes."""
+        pieces = self.tts_iter(
+            source,
+            speaker_id,
+            sdp_ratio=sdp_ratio,
+            noise_scale=noise_scale,
+            noise_scale_w=noise_scale_w,
+            speed=speed,
+            chunk_size=chunk_size)
+        with soundfile.SoundFile(output_path, 'w', samplerate=self.hps.data.sampling_rate, channels=1,
+                                 format=format) as f:
+            for audio in (pieces if quiet else tqdm(pieces)):
+                f.write(audio)
+        torch.cuda.empty_cache()
+
     def tts_to_file(
         self,
         text,
@@ -89,9 +295,10 @@ class TTS(nn.Module):
         format=None,
         position=None,
         quiet=False,
+        target_phones=None,
     ):
         language = self.language
-        texts = self.split_sentences_into_pieces(text, language, quiet)
+        texts = self.split_sentences_into_pieces(text, language, quiet, target_phones=target_phones)
         audio_list = []
         if pbar:
             tx = pbar(texts)
@@ -103,35 +310,14 @@ class TTS(nn.Module):
             else:
                 tx = tqdm(texts)
         for t in tx:
-            if language in ['EN', 'ZH_MIX_EN']:
-                t = re.sub(r'([a-z])([A-Z])', r'\1 \2', t)
-            device = self.device
-            bert, ja_bert, phones, tones, lang_ids = utils.get_text_for_tts_infer(
-                t, language, self.hps, device, self.symbol_to_id)
-            with torch.no_grad():
-                x_tst = phones.to(device).unsqueeze(0)
-                tones = tones.to(device).unsqueeze(0)
-                lang_ids = lang_ids.to(device).unsqueeze(0)
-                bert = bert.to(device).unsqueeze(0)
-                ja_bert = ja_bert.to(device).unsqueeze(0)
-                x_tst_lengths = torch.LongTensor([phones.size(0)]).to(device)
-                del phones
-                speakers = torch.LongTensor([speaker_id]).to(device)
-                audio = self.model.infer(
-                    x_tst,
-                    x_tst_lengths,
-                    speakers,
-                    tones,
-                    lang_ids,
-                    bert,
-                    ja_bert,
-                    sdp_ratio=sdp_ratio,
-                    noise_scale=noise_scale,
-                    noise_scale_w=noise_scale_w,
-                    length_scale=1. / speed,
-                )[0][0, 0].data.cpu().float().numpy()
-                del x_tst, tones, lang_ids, bert, ja_bert, x_tst_lengths, speakers
-                #
+            audio = self.synthesize_piece(
+                t,
+                speaker_id,
+                sdp_ratio=sdp_ratio,
+                noise_scale=noise_scale,
+                noise_scale_w=noise_scale_w,
+                speed=speed,
+            )
             audio_list.append(audio)
         torch.cuda.empty_cache()
         audio = self.audio_numpy_concat(audio_list, sr=self.hps.data.sampling_rate, speed=speed)
@@ -0,0 +1,225 @@
+"""Frontend artifacts: model inputs serialized to shards, so text processing and synthesis can run apart.
+
+A shard is an uncompressed ``.npz`` holding, for a group of utterances, the concatenated phone/tone/language
+ids (int32, blanks included) with per-utterance offsets, the one BERT stream the language uses as float16
+``[dim, frames]``, and JSON metadata (utterance ids, texts, language, model symbols). Shards are written
+atomically, so a consumer polling the directory never sees a partial one::
+
+    python -m meloplus.artifacts frontend corpus.txt shards/ -l EN --workers 8
+    python -m meloplus.artifacts synthesize shards/ wavs/ -l EN --watch
+"""
+import json
+import os
+import re
+import time
+
+import click
+import numpy as np
+import soundfile
+import torch
+
+from meloplus.text import language_bert_stream_map
+
+FORMAT_VERSION = 1
+SHARD_SUFFIX = ".npz"
+DONE_SUFFIX = ".done"
+# written by ``frontend`` once every shard of the corpus exists
+COMPLETE_MARKER = "_complete"
+
+
+def bert_stream(language_str, hps):
+    """Name of the BERT input the model reads for ``language_str``, or None when BERT is disabled."""
+    if getattr(hps.data, "disable_bert", False):
+        return None
+    return language_bert_stream_map[language_str]
+
+
+def _write_atomic(path, **arrays):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def write_shard(path, utt_ids, texts, inputs, language_str, hps):
+    """Save ``(bert, ja_bert, phones, tones, lang_ids)`` model inputs of the given utterances to ``path``."""
+    stream = bert_stream(language_str, hps)
+    lengths = [x[2].size(0) for x in inputs]
+    offsets = np.zeros(len(inputs) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    arrays = {
+        "offsets": offsets,
+        "phones": torch.cat([x[2] for x in inputs]).numpy().astype(np.int32),
+        "tones": torch.cat([x[3] for x in inputs]).numpy().astype(np.int32),
+        "languages": torch.cat([x[4] for x in inputs]).numpy().astype(np.int32),
+    }
+    index = {"bert": 0, "ja_bert": 1}.get(stream)
+    if index is not None and all(x[index] is not None for x in inputs):
+        bert = torch.cat([x[index].float().cpu() for x in inputs], dim=-1)
+        arrays["bert"] = bert.numpy().astype(np.float16)
+    else:
+        # e.g. inputs made without norm_text carry no features
+        stream = None
+    meta = {
+        "version": FORMAT_VERSION,
+        "language": language_str,
+        "bert_stream": stream,
+        "symbols": list(hps.symbols),
+        "ids": list(utt_ids),
+        "texts": list(texts),
+    }
+    arrays["meta"] = np.array(json.dumps(meta, ensure_ascii=False))
+    _write_atomic(path, **arrays)
+
+
+def read_shard(path, symbols=None):
+    """Return ``(meta, inputs)`` of a shard, with inputs in the form ``TTS.synthesize_batch`` takes.
+
+    When ``symbols`` is given, the shard must have been made for the same symbol table.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(data["meta"].item())
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported artifact version {meta['version']} in {path}")
+        if symbols is not None and meta["symbols"] != list(symbols):
+            raise ValueError(f"{path} was made for a different symbol table")
+        offsets = data["offsets"]
+        phones = torch.from_numpy(data["phones"].astype(np.int64))
+        tones = torch.from_numpy(data["tones"].astype(np.int64))
+        languages = torch.from_numpy(data["languages"].astype(np.int64))
+        bert = torch.from_numpy(data["bert"].astype(np.float32)) if meta["bert_stream"] else None
+
+    inputs = []
+    for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+        streams = {"bert": None, "ja_bert": None}
+        if bert is not None:
+            streams[meta["bert_stream"]] = bert[:, start:end]
+        inputs.append(
+            (streams["bert"], streams["ja_bert"], phones[start:end], tones[start:end], languages[start:end]))
+    return meta, inputs
+
+
+def read_corpus(path):
+    """``(utt_id, text)`` pairs of a corpus file: ``utt_id|text`` lines, or plain lines numbered from 0."""
+    with open(path, encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            utt_id, sep, text = line.partition("|")
+            yield (utt_id, text) if sep else (f"{i:08d}", line)
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@click.group()
+def main():
+    pass
+
+
+@main.command()
+@click.argument("corpus", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output_dir", type=click.Path(file_okay=False))
+@click.option("--language", "-l", default="EN", help="Model language, e.g. EN, EN_V2, ZH")
+@click.option("--config-path", default=None, help="Model config, downloaded for the language by default")
+@click.option("--device", "-d", default="cpu", help="Device for the BERT features")
+@click.option("--workers", "-w", default=1, help="Processes for text normalization and G2P")
+@click.option("--shard-size", default=256, help="Utterances per shard")
+def frontend(corpus, output_dir, language, config_path, device, workers, shard_size):
+    """Turn a text corpus into artifact shards; existing shards are kept, so an interrupted run resumes."""
+    from meloplus import utils
+    from meloplus.api import TTS
+    from meloplus.download_utils import load_or_download_config
+    from meloplus.text.cleaner import clean_text_batch
+
+    hps = load_or_download_config(language, config_path=config_path)
+    symbol_to_id = {s: i for i, s in enumerate(hps.symbols)}
+    language_str = TTS.text_language(language)
+    os.makedirs(output_dir, exist_ok=True)
+
+    for index, chunk in enumerate(_chunks(read_corpus(corpus), shard_size)):
+        path = os.path.join(output_dir, f"shard-{index:06d}{SHARD_SUFFIX}")
+        if os.path.exists(path):
+            continue
+        utt_ids, texts = zip(*chunk)
+        if language_str in ['EN', 'ZH_MIX_EN']:
+            # same preprocessing as TTS.synthesize_piece
+            texts = [re.sub(r'([a-z])([A-Z])', r'\1 \2', t) for t in texts]
+        cleaned = clean_text_batch(texts, language_str, workers=workers)
+        inputs = [
+            utils.get_text_from_phonemes(
+                phones, tones, word2ph, language_str, hps, device, symbol_to_id, norm_text=norm_text)
+            for norm_text, phones, tones, word2ph in cleaned
+        ]
+        write_shard(path, utt_ids, [c[0] for c in cleaned], inputs, language_str, hps)
+        print(f"Wrote {path} ({len(inputs)} utterances)")
+    open(os.path.join(output_dir, COMPLETE_MARKER), "w").close()
+
+
+@main.command()
+@click.argument("shard_dir", type=click.Path(file_okay=False))
+@click.argument("output_dir", type=click.Path(file_okay=False))
+@click.option("--language", "-l", default="EN", help="Model language, e.g. EN, EN_V2, ZH")
+@click.option("--config-path", default=None)
+@click.option("--ckpt-path", default=None)
+@click.option("--device", "-d", default="auto")
+@click.option("--speaker", "-spk", default=None, help="Speaker name, defaults to the first speaker")
+@click.option("--speed", "-s", default=1.0)
+@click.option("--batch-size", "-b", default=16, help="Utterances per inference batch")
+@click.option(
+    "--watch", is_flag=True, default=False, help="Keep polling SHARD_DIR until the frontend completes")
+@click.option("--poll-interval", default=5.0)
+def synthesize(
+    shard_dir,
+    output_dir,
+    language,
+    config_path,
+    ckpt_path,
+    device,
+    speaker,
+    speed,
+    batch_size,
+    watch,
+    poll_interval,
+):
+    """Synthesize every shard of SHARD_DIR to ``OUTPUT_DIR/<utt_id>.wav``, marking finished shards as done."""
+    from meloplus.api import TTS
+
+    model = TTS(language=language, device=device, config_path=config_path, ckpt_path=ckpt_path)
+    speaker_ids = model.hps.data.spk2id
+    speaker_id = speaker_ids[speaker] if speaker else speaker_ids[list(speaker_ids.keys())[0]]
+    sampling_rate = model.hps.data.sampling_rate
+    os.makedirs(output_dir, exist_ok=True)
+
+    while True:
+        # the completion marker is checked before listing, so no shard written before it is missed
+        complete = os.path.exists(os.path.join(shard_dir, COMPLETE_MARKER))
+        pending = [
+            name for name in sorted(os.listdir(shard_dir)) if name.endswith(SHARD_SUFFIX) and
+            not os.path.exists(os.path.join(output_dir, name + DONE_SUFFIX))
+        ]
+        for name in pending:
+            meta, inputs = read_shard(os.path.join(shard_dir, name), symbols=model.hps.symbols)
+            audios = model.synthesize_batch(inputs, speaker_id, speed=speed, max_batch_size=batch_size)
+            for utt_id, audio in zip(meta["ids"], audios):
+                soundfile.write(os.path.join(output_dir, f"{utt_id}.wav"), audio, sampling_rate)
+            open(os.path.join(output_dir, name + DONE_SUFFIX), "w").close()
+            print(f"Synthesized {name} ({len(audios)} utterances)")
+        if not watch or (complete and not pending):
+            break
+        if not pending:
+            time.sleep(poll_interval)
+    torch.cuda.empty_cache()
+
+
+if __name__ == "__main__":
+    main()
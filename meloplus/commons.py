@@ -26,6 +26,13 @@ def intersperse(lst, item):
     return result
 
 
+def intersperse_tensor(x, item):
+    """``intersperse`` for a 1-D tensor."""
+    result = x.new_full((x.size(0) * 2 + 1, ), item)
+    result[1::2] = x
+    return result
+
+
 def kl_divergence(m_p, logs_p, m_q, logs_q):
     """KL(P||Q)"""
     kl = (logs_q - logs_p) - 0.5
@@ -138,19 +145,33 @@ def generate_path(duration, mask):
     return path
 
 
-def clip_grad_value_(parameters, clip_value, norm_type=2):
+def clip_grad_value_(parameters, clip_value, norm_type=2, as_tensor=False):
+    """Clamp gradients to ``[-clip_value, clip_value]`` and return their total norm from before clamping.
+
+    Norms are computed with one ``torch._foreach_norm`` per device and dtype and reduced on the device, so
+    the only host sync is the final ``.item()``; ``as_tensor=True`` returns the 0-dim tensor instead.
+    """
     if isinstance(parameters, torch.Tensor):
         parameters = [parameters]
-    parameters = list(filter(lambda p: p.grad is not None, parameters))
+    grads = [p.grad.detach() for p in parameters if p.grad is not None]
     norm_type = float(norm_type)
     if clip_value is not None:
         clip_value = float(clip_value)
+    if not grads:
+        return torch.zeros(()) if as_tensor else 0.0
+
+    groups = {}
+    for g in grads:
+        groups.setdefault((g.device, g.dtype), []).append(g)
+    device = grads[0].device
+    norms = []
+    for group in groups.values():
+        norms.extend(n.to(device) for n in torch._foreach_norm(group, norm_type))
+    # accumulated in float64, like the python float sum it replaces
+    total_norm = torch.stack(norms).double().pow(norm_type).sum().pow(1.0 / norm_type)
 
-    total_norm = 0
-    for p in parameters:
-        param_norm = p.grad.data.norm(norm_type)
-        total_norm += param_norm.item()**norm_type
-        if clip_value is not None:
-            p.grad.data.clamp_(min=-clip_value, max=clip_value)
-    total_norm = total_norm**(1.0 / norm_type)
-    return total_norm
+    if clip_value is not None:
+        for group in groups.values():
+            torch._foreach_clamp_min_(group, -clip_value)
+            torch._foreach_clamp_max_(group, clip_value)
+    return total_norm if as_tensor else total_norm.item()
@@ -0,0 +1,253 @@
+"""Sharded, memory-mapped training data.
+
+``pack`` turns a filelist (as read by ``TextAudioSpeakerLoader``) into a few shard directories, each with
+one ``.npy`` file per field holding the items back to back, an ``index.npy`` of per-item offsets and a
+``meta.json`` written last. ``ShardedTextAudioSpeakerLoader`` maps them with ``np.load(mmap_mode="c")``
+and returns views into the mapped pages, so a sample costs no file open or unpickling.
+"""
+import glob
+import json
+import os
+import struct
+
+import click
+import numpy as np
+import torch
+import torch.utils.data
+from tqdm import tqdm
+
+FORMAT_VERSION = 2
+# columns of index.npy; *_START/*_END are offsets into the field arrays, BERT starts are -1 when absent
+(WAV_START, WAV_END, SPEC_START, SPEC_END, TEXT_START, TEXT_END, BERT_START, JA_BERT_START, SID) = range(9)
+INDEX_COLUMNS = 9
+# hparams a shard was packed with, which must match the training config
+SIGNATURE_KEYS = ["sampling_rate", "filter_length", "hop_length", "win_length", "add_blank"]
+# fixed size of the .npy headers, so that a header can be rewritten once the row count is known
+NPY_HEADER_SIZE = 128
+
+
+def _save_atomic(path, array):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+class _NpyWriter:
+    """Appends rows to a ``.npy`` file as they arrive; the header gets the row count on ``close``."""
+
+    def __init__(self, path, dtype, row_shape=()):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.rows = 0
+        self.file = open(self.tmp_path, "wb")
+        self.file.write(self._header())
+
+    def _header(self):
+        header = {
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (self.rows, ) + self.row_shape,
+        }
+        text = repr(header).encode("latin1")
+        text += b" " * (NPY_HEADER_SIZE - 10 - 1 - len(text)) + b"\n"
+        return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(text)) + text
+
+    def append(self, array):
+        array = np.ascontiguousarray(array, dtype=self.dtype)
+        self.file.write(array.tobytes())
+        self.rows += array.shape[0]
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(self._header())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def _signature(hparams):
+    signature = {key: getattr(hparams, key) for key in SIGNATURE_KEYS}
+    signature["use_mel_posterior_encoder"] = getattr(hparams, "use_mel_posterior_encoder", False)
+    return signature
+
+
+def write_shard(shard_dir, items, hparams, audio_dtype="int16"):
+    """Pack ``TextAudioSpeakerLoader`` items ``(phones, spec, wav, sid, tone, language, bert, ja_bert)``.
+
+    ``items`` may be an iterator; each item is converted to its stored dtypes and appended to the field
+    files as soon as it arrives, so only the index is kept in memory.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    if getattr(hparams, "use_mel_posterior_encoder", False):
+        spec_channels = getattr(hparams, "n_mel_channels", 80)
+    else:
+        spec_channels = hparams.filter_length // 2 + 1
+
+    def writer(name, dtype, row_shape=()):
+        return _NpyWriter(os.path.join(shard_dir, f"{name}.npy"), dtype, row_shape)
+
+    writers = {
+        "wav": writer("wav", audio_dtype),
+        # [frames, channels] so that an item is a contiguous block of rows
+        "spec": writer("spec", np.float16, (spec_channels, )),
+        "phones": writer("phones", np.int64),
+        "tones": writer("tones", np.int64),
+        "languages": writer("languages", np.int64),
+        "bert": writer("bert", np.float16, (1024, )),
+        "ja_bert": writer("ja_bert", np.float16, (768, )),
+    }
+    rows = []
+    for phones, spec, wav, sid, tone, language, bert, ja_bert in items:
+        wav = wav.reshape(-1).float().numpy()
+        if audio_dtype == "int16":
+            wav = np.clip(np.round(wav * hparams.max_wav_value), -32768, 32767)
+        row = np.zeros(INDEX_COLUMNS, dtype=np.int64)
+        rows.append(row)
+        row[WAV_START], row[SPEC_START], row[TEXT_START] = (
+            writers["wav"].rows, writers["spec"].rows, writers["phones"].rows)
+        writers["wav"].append(wav)
+        writers["spec"].append(spec.T.float().numpy())
+        writers["phones"].append(phones.numpy())
+        writers["tones"].append(tone.numpy())
+        writers["languages"].append(language.numpy())
+        row[WAV_END], row[SPEC_END], row[TEXT_END] = (
+            writers["wav"].rows, writers["spec"].rows, writers["phones"].rows)
+        row[SID] = int(sid)
+        # only the streams that carry features are stored
+        row[BERT_START] = row[JA_BERT_START] = -1
+        if bert is not None and bert.any():
+            row[BERT_START] = writers["bert"].rows
+            writers["bert"].append(bert.T.float().numpy())
+        if ja_bert is not None and ja_bert.any():
+            row[JA_BERT_START] = writers["ja_bert"].rows
+            writers["ja_bert"].append(ja_bert.T.float().numpy())
+
+    for w in writers.values():
+        w.close()
+    index = np.array(rows, dtype=np.int64).reshape(-1, INDEX_COLUMNS)
+    _save_atomic(os.path.join(shard_dir, "index.npy"), index)
+
+    meta = {
+        "version": FORMAT_VERSION,
+        "count": len(rows),
+        "audio_dtype": audio_dtype,
+        "max_wav_value": hparams.max_wav_value,
+        "signature": _signature(hparams),
+    }
+    # meta.json marks the shard as complete
+    tmp_path = os.path.join(shard_dir, f"meta.json.{os.getpid()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(shard_dir, "meta.json"))
+
+
+def list_shards(root):
+    """Complete shard directories under ``root`` (or ``root`` itself when it is one), in order."""
+    if os.path.exists(os.path.join(root, "meta.json")):
+        return [root]
+    return sorted(os.path.dirname(p) for p in glob.glob(os.path.join(root, "*", "meta.json")))
+
+
+class ShardedTextAudioSpeakerLoader(torch.utils.data.Dataset):
+    """Drop-in replacement for ``TextAudioSpeakerLoader`` reading packed shards.
+
+    Every field is a view of the mapped files: float16 spectrograms and BERT features, int64 ids and the
+    audio in its stored dtype. The collate function casts them while copying into its padded batch and
+    scales integer audio by ``max_wav_value``. A BERT stream the item does not use is None.
+    """
+
+    def __init__(self, root, hparams):
+        self.shard_dirs = list_shards(root)
+        if not self.shard_dirs:
+            raise FileNotFoundError(f"No packed shards found in {root}")
+        signature = _signature(hparams)
+        self.metas = []
+        indices = []
+        for shard_dir in self.shard_dirs:
+            with open(os.path.join(shard_dir, "meta.json")) as f:
+                meta = json.load(f)
+            if meta["version"] != FORMAT_VERSION:
+                raise ValueError(f"Unsupported shard version {meta['version']} in {shard_dir}")
+            if meta["signature"] != signature:
+                raise ValueError(
+                    f"{shard_dir} was packed with {meta['signature']}, which does not match {signature}")
+            if meta["audio_dtype"] == "int16" and meta["max_wav_value"] != hparams.max_wav_value:
+                raise ValueError(f"{shard_dir} was packed with max_wav_value {meta['max_wav_value']}")
+            self.metas.append(meta)
+            indices.append(np.load(os.path.join(shard_dir, "index.npy")))
+
+        # global item -> (shard, row)
+        self.items = [(s, r) for s, index in enumerate(indices) for r in range(index.shape[0])]
+        self.indices = indices
+        self.lengths = [int(n) for index in indices for n in index[:, SPEC_END] - index[:, SPEC_START]]
+        # opened lazily, so that each DataLoader worker maps the files itself
+        self.shards = {}
+
+    def _shard(self, s):
+        shard = self.shards.get(s)
+        if shard is None:
+            shard_dir = self.shard_dirs[s]
+            shard = self.shards[s] = {
+                name: np.load(os.path.join(shard_dir, f"{name}.npy"), mmap_mode="c")
+                for name in ["wav", "spec", "phones", "tones", "languages", "bert", "ja_bert"]
+            }
+        return shard
+
+    def __getitem__(self, i):
+        s, r = self.items[i]
+        shard = self._shard(s)
+        row = self.indices[s][r]
+
+        text = slice(row[TEXT_START], row[TEXT_END])
+        n = int(row[TEXT_END] - row[TEXT_START])
+        phones = torch.from_numpy(shard["phones"][text])
+        tone = torch.from_numpy(shard["tones"][text])
+        language = torch.from_numpy(shard["languages"][text])
+        spec = torch.from_numpy(shard["spec"][row[SPEC_START]:row[SPEC_END]]).T
+        # integer audio is scaled by max_wav_value in the collate function
+        wav = torch.from_numpy(shard["wav"][row[WAV_START]:row[WAV_END]]).unsqueeze(0)
+        sid = torch.LongTensor([int(row[SID])])
+
+        bert = ja_bert = None
+        if row[BERT_START] >= 0:
+            bert = torch.from_numpy(shard["bert"][row[BERT_START]:row[BERT_START] + n]).T
+        if row[JA_BERT_START] >= 0:
+            ja_bert = torch.from_numpy(shard["ja_bert"][row[JA_BERT_START]:row[JA_BERT_START] + n]).T
+        return (phones, spec, wav, sid, tone, language, bert, ja_bert)
+
+    def __len__(self):
+        return len(self.items)
+
+
+@click.command()
+@click.option("--filelist", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--config", "config_path", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--output-dir", required=True, type=click.Path(file_okay=False))
+@click.option("--shard-size", default=2000, help="Items per shard")
+@click.option("--audio-dtype", default="int16", type=click.Choice(["int16", "float16", "float32"]))
+@click.option("--workers", default=8, help="DataLoader workers reading the source files")
+def pack(filelist, config_path, output_dir, shard_size, audio_dtype, workers):
+    """Pack a cleaned filelist with its wavs, spectrograms and BERT features into shards.
+
+    Shards that are already complete are skipped, so an interrupted run can be resumed.
+    """
+    from data_utils import TextAudioSpeakerLoader
+    from utils import get_hparams_from_file
+
+    hps = get_hparams_from_file(config_path)
+    dataset = TextAudioSpeakerLoader(filelist, hps.data)
+    n_shards = (len(dataset) + shard_size - 1) // shard_size
+    for s in range(n_shards):
+        shard_dir = os.path.join(output_dir, f"shard-{s:05d}")
+        if os.path.exists(os.path.join(shard_dir, "meta.json")):
+            continue
+        stop = min((s + 1) * shard_size, len(dataset))
+        subset = torch.utils.data.Subset(dataset, range(s * shard_size, stop))
+        loader = torch.utils.data.DataLoader(subset, batch_size=None, num_workers=workers)
+        write_shard(shard_dir, tqdm(loader, desc=shard_dir), hps.data, audio_dtype=audio_dtype)
+
+
+if __name__ == "__main__":
+    pack()
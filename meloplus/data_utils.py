@@ -7,13 +7,90 @@ import torch
 import torch.utils.data
 from loguru import logger
 from mel_processing import mel_spectrogram_torch, spectrogram_torch
-from text import cleaned_text_to_sequence, get_bert
+from text import cleaned_text_to_sequence, get_bert, split_bert_streams
 from tqdm import tqdm
-from utils import load_filepaths_and_text
-from utils import load_wav_to_torch_librosa as load_wav_to_torch
+from utils import load_filepaths_and_text, load_length_index
+from utils import load_wav_to_torch_fast as load_wav_to_torch
 """Multi speaker version"""
 
 
+def spec_signature(hparams):
+    """Settings a cached spectrogram depends on; a cache entry with a different signature is recomputed."""
+    signature = {
+        "sampling_rate": hparams.sampling_rate,
+        "filter_length": hparams.filter_length,
+        "hop_length": hparams.hop_length,
+        "win_length": hparams.win_length,
+    }
+    if getattr(hparams, "use_mel_posterior_encoder", False):
+        signature.update(
+            n_mel_channels=getattr(hparams, "n_mel_channels", 80),
+            mel_fmin=hparams.mel_fmin,
+            mel_fmax=hparams.mel_fmax,
+        )
+    return signature
+
+
+def spec_cache_path(audiopath, hparams):
+    suffix = ".mel.pt" if getattr(hparams, "use_mel_posterior_encoder", False) else ".spec.pt"
+    return audiopath.replace(".wav", suffix)
+
+
+def compute_spec(audio_norm, hparams):
+    """Spectrogram (or mel spectrogram) ``[channels, frames]`` of a ``[1, samples]`` waveform."""
+    if getattr(hparams, "use_mel_posterior_encoder", False):
+        spec = mel_spectrogram_torch(
+            audio_norm,
+            hparams.filter_length,
+            getattr(hparams, "n_mel_channels", 80),
+            hparams.sampling_rate,
+            hparams.hop_length,
+            hparams.win_length,
+            hparams.mel_fmin,
+            hparams.mel_fmax,
+            center=False,
+        )
+    else:
+        spec = spectrogram_torch(
+            audio_norm,
+            hparams.filter_length,
+            hparams.sampling_rate,
+            hparams.hop_length,
+            hparams.win_length,
+            center=False,
+        )
+    return torch.squeeze(spec, 0)
+
+
+def load_cached_spec(spec_filename, signature, n_samples=None):
+    """Cached spectrogram as float32, or None when it is missing, stale or unreadable.
+
+    With ``n_samples``, an entry whose frame count does not match the audio (center=False STFT with
+    symmetric padding, i.e. ``n_samples // hop_length`` frames) is treated as stale too.
+    """
+    if not os.path.exists(spec_filename):
+        return None
+    try:
+        entry = torch.load(spec_filename, map_location="cpu")
+    except Exception:
+        return None
+    # bare tensors were written before entries carried a signature
+    if not isinstance(entry, dict) or entry.get("signature") != signature:
+        return None
+    spec = entry["spec"]
+    if n_samples is not None and spec.size(-1) != n_samples // signature["hop_length"]:
+        return None
+    return spec.float()
+
+
+def save_cached_spec(spec_filename, spec, signature, fp16=False):
+    """Write a cache entry atomically, so concurrent DataLoader workers never read a partial file."""
+    entry = {"signature": signature, "spec": spec.half() if fp16 else spec}
+    tmp_path = f"{spec_filename}.{os.getpid()}.tmp"
+    torch.save(entry, tmp_path)
+    os.replace(tmp_path, spec_filename)
+
+
 class TextAudioSpeakerLoader(torch.utils.data.Dataset):
     """
     1) loads audio, speaker_id, text pairs
@@ -22,6 +99,7 @@ class TextAudioSpeakerLoader(torch.utils.data.Dataset):
     """
 
     def __init__(self, audiopaths_sid_text, hparams):
+        self.filelist = audiopaths_sid_text
         self.audiopaths_sid_text = load_filepaths_and_text(audiopaths_sid_text)
         self.max_wav_value = hparams.max_wav_value
         self.sampling_rate = hparams.sampling_rate
@@ -36,6 +114,8 @@ class TextAudioSpeakerLoader(torch.utils.data.Dataset):
         self.use_mel_spec_posterior = getattr(hparams, "use_mel_posterior_encoder", False)
         if self.use_mel_spec_posterior:
             self.n_mel_channels = getattr(hparams, "n_mel_channels", 80)
+        self.spec_signature = spec_signature(hparams)
+        self.spec_cache_fp16 = getattr(hparams, "spec_cache_fp16", False)
 
         self.cleaned_text = getattr(hparams, "cleaned_text", False)
 
@@ -52,11 +132,10 @@ class TextAudioSpeakerLoader(torch.utils.data.Dataset):
         Filter text & store spec lengths
         """
         # Store spectrogram lengths for Bucketing
-        # wav_length ~= file_size / (wav_channels * Bytes per dim) = file_size / (1 * 2)
-        # spec_length = wav_length // hop_length
+        # spec_length = wav_length // hop_length, with wav_length read from the audio headers and cached
+        # next to the filelist
 
         audiopaths_sid_text_new = []
-        lengths = []
         skipped = 0
         logger.info("Init dataset...")
         for item in tqdm(self.audiopaths_sid_text):
@@ -71,9 +150,10 @@ class TextAudioSpeakerLoader(torch.utils.data.Dataset):
                 tone = [int(i) for i in tone.split(" ")]
                 word2ph = [int(i) for i in word2ph.split(" ")]
                 audiopaths_sid_text_new.append([audiopath, spk, language, text, phones, tone, word2ph])
-                lengths.append(os.path.getsize(audiopath) // (2 * self.hop_length))
             else:
                 skipped += 1
+        lengths = load_length_index(
+            self.filelist, [item[0] for item in audiopaths_sid_text_new], self.sampling_rate, self.hop_length)
         logger.info(f'min: {min(lengths)}; max: {max(lengths)}')
         logger.info("skipped: " + str(skipped) + ", total: " + str(len(self.audiopaths_sid_text)))
         self.audiopaths_sid_text = audiopaths_sid_text_new
@@ -99,36 +179,14 @@ class TextAudioSpeakerLoader(torch.utils.data.Dataset):
         # NOTE: normalize has been achieved by torchaudio
         # audio_norm = audio / self.max_wav_value
         audio_norm = audio_norm.unsqueeze(0)
-        spec_filename = filename.replace(".wav", ".spec.pt")
-        if self.use_mel_spec_posterior:
-            spec_filename = spec_filename.replace(".spec.pt", ".mel.pt")
-        try:
-            spec = torch.load(spec_filename)
-            assert False
-        except:
-            if self.use_mel_spec_posterior:
-                spec = mel_spectrogram_torch(
-                    audio_norm,
-                    self.filter_length,
-                    self.n_mel_channels,
-                    self.sampling_rate,
-                    self.hop_length,
-                    self.win_length,
-                    self.hparams.mel_fmin,
-                    self.hparams.mel_fmax,
-                    center=False,
-                )
-            else:
-                spec = spectrogram_torch(
-                    audio_norm,
-                    self.filter_length,
-                    self.sampling_rate,
-                    self.hop_length,
-                    self.win_length,
-                    center=False,
-                )
-            spec = torch.squeeze(spec, 0)
-            torch.save(spec, spec_filename)
+        spec_filename = spec_cache_path(filename, self.hparams)
+        spec = load_cached_spec(spec_filename, self.spec_signature, n_samples=audio_norm.size(-1))
+        if spec is None:
+            spec = compute_spec(audio_norm, self.hparams)
+            try:
+                save_cached_spec(spec_filename, spec, self.spec_signature, fp16=self.spec_cache_fp16)
+            except OSError as e:
+                logger.warning(f"Could not cache {spec_filename}: {e}")
         return spec, audio_norm
 
     def get_text(self, text, word2ph, phone, tone, language_str, wav_path):
@@ -140,31 +198,19 @@ class TextAudioSpeakerLoader(torch.utils.data.Dataset):
             for i in range(len(word2ph)):
                 word2ph[i] = word2ph[i] * 2
             word2ph[0] += 1
-        bert_path = wav_path.replace(".wav", ".bert.pt")
-        try:
-            bert = torch.load(bert_path)
-            assert bert.shape[-1] == len(phone)
-        except Exception as e:
-            print(e, wav_path, bert_path, bert.shape, len(phone))
-            bert = get_bert(text, word2ph, language_str)
-            torch.save(bert, bert_path)
-            assert bert.shape[-1] == len(phone), phone
-
-        if self.disable_bert:
-            bert = torch.zeros(1024, len(phone))
-            ja_bert = torch.zeros(768, len(phone))
-        else:
-            if language_str in ["ZH"]:
-                bert = bert
-                ja_bert = torch.zeros(768, len(phone))
-            elif language_str in ["JP", "EN", "ZH_MIX_EN", "KR", 'SP', 'ES', 'FR', 'DE', 'RU', 'TH']:
-                ja_bert = bert
-                bert = torch.zeros(1024, len(phone))
-            else:
-                raise
-                bert = torch.zeros(1024, len(phone))
-                ja_bert = torch.zeros(768, len(phone))
-        assert bert.shape[-1] == len(phone)
+        # only the stream the language uses is carried, the other one is None (zero features)
+        bert = ja_bert = None
+        if not self.disable_bert:
+            bert_path = wav_path.replace(".wav", ".bert.pt")
+            try:
+                bert = torch.load(bert_path)
+                assert bert.shape[-1] == len(phone)
+            except Exception as e:
+                print(e, wav_path, bert_path, len(phone))
+                bert = get_bert(text, word2ph, language_str)
+                torch.save(bert, bert_path)
+                assert bert.shape[-1] == len(phone), phone
+            bert, ja_bert = split_bert_streams(bert, language_str)
         phone = torch.LongTensor(phone)
         tone = torch.LongTensor(tone)
         language = torch.LongTensor(language)
@@ -181,11 +227,35 @@ class TextAudioSpeakerLoader(torch.utils.data.Dataset):
         return len(self.audiopaths_sid_text)
 
 
+def pad_1d(seqs, out):
+    """Right zero-pad 1-D tensors into the uninitialized ``out`` ``[B, T]``, copying each one in place."""
+    for i, x in enumerate(seqs):
+        out[i, :x.size(0)].copy_(x)
+        out[i, x.size(0):].zero_()
+    return out
+
+
+def pad_2d(mats, out):
+    """Right zero-pad ``[C, T_i]`` tensors into the uninitialized ``out`` ``[B, C, T]``; None rows stay 0."""
+    for i, x in enumerate(mats):
+        if x is None:
+            out[i].zero_()
+            continue
+        out[i, :, :x.size(1)].copy_(x)
+        out[i, :, x.size(1):].zero_()
+    return out
+
+
 class TextAudioSpeakerCollate:
-    """Zero-pads model inputs and targets"""
+    """Zero-pads model inputs and targets
+
+    A BERT stream that no item of the batch carries (``None`` in every item) is returned as ``None``.
+    Integer audio (as returned by the packed shard loader) is scaled by ``max_wav_value``.
+    """
 
-    def __init__(self, return_ids=False):
+    def __init__(self, return_ids=False, max_wav_value=32768.0):
         self.return_ids = return_ids
+        self.max_wav_value = max_wav_value
 
     def __call__(self, batch):
         """Collate's training batch from normalized text, audio and speaker identities
@@ -194,61 +264,34 @@ class TextAudioSpeakerCollate:
         batch: [text_normalized, spec_normalized, wav_normalized, sid]
         """
         # Right zero-pad all one-hot text sequences to max input length
-        _, ids_sorted_decreasing = torch.sort(
-            torch.LongTensor([x[1].size(1) for x in batch]), dim=0, descending=True)
-
-        max_text_len = max([len(x[0]) for x in batch])
-        max_spec_len = max([x[1].size(1) for x in batch])
-        max_wav_len = max([x[2].size(1) for x in batch])
-
-        text_lengths = torch.LongTensor(len(batch))
-        spec_lengths = torch.LongTensor(len(batch))
-        wav_lengths = torch.LongTensor(len(batch))
-        sid = torch.LongTensor(len(batch))
-
-        text_padded = torch.LongTensor(len(batch), max_text_len)
-        tone_padded = torch.LongTensor(len(batch), max_text_len)
-        language_padded = torch.LongTensor(len(batch), max_text_len)
-        bert_padded = torch.FloatTensor(len(batch), 1024, max_text_len)
-        ja_bert_padded = torch.FloatTensor(len(batch), 768, max_text_len)
-
-        spec_padded = torch.FloatTensor(len(batch), batch[0][1].size(0), max_spec_len)
-        wav_padded = torch.FloatTensor(len(batch), 1, max_wav_len)
-        text_padded.zero_()
-        tone_padded.zero_()
-        language_padded.zero_()
-        spec_padded.zero_()
-        wav_padded.zero_()
-        bert_padded.zero_()
-        ja_bert_padded.zero_()
-        for i in range(len(ids_sorted_decreasing)):
-            row = batch[ids_sorted_decreasing[i]]
-
-            text = row[0]
-            text_padded[i, :text.size(0)] = text
-            text_lengths[i] = text.size(0)
-
-            spec = row[1]
-            spec_padded[i, :, :spec.size(1)] = spec
-            spec_lengths[i] = spec.size(1)
-
-            wav = row[2]
-            wav_padded[i, :, :wav.size(1)] = wav
-            wav_lengths[i] = wav.size(1)
-
-            sid[i] = row[3]
-
-            tone = row[4]
-            tone_padded[i, :tone.size(0)] = tone
-
-            language = row[5]
-            language_padded[i, :language.size(0)] = language
-
-            bert = row[6]
-            bert_padded[i, :, :bert.size(1)] = bert
-
-            ja_bert = row[7]
-            ja_bert_padded[i, :, :ja_bert.size(1)] = ja_bert
+        spec_lengths = torch.LongTensor([x[1].size(1) for x in batch])
+        _, ids_sorted_decreasing = torch.sort(spec_lengths, dim=0, descending=True)
+        batch = [batch[i] for i in ids_sorted_decreasing.tolist()]
+        spec_lengths = spec_lengths[ids_sorted_decreasing]
+        text_lengths = torch.LongTensor([len(x[0]) for x in batch])
+        wav_lengths = torch.LongTensor([x[2].size(1) for x in batch])
+        sid = torch.LongTensor([int(x[3]) for x in batch])
+
+        b = len(batch)
+        max_text_len = int(text_lengths.max())
+        text_padded = pad_1d([x[0] for x in batch], torch.empty(b, max_text_len, dtype=torch.long))
+        tone_padded = pad_1d([x[4] for x in batch], torch.empty(b, max_text_len, dtype=torch.long))
+        language_padded = pad_1d([x[5] for x in batch], torch.empty(b, max_text_len, dtype=torch.long))
+        spec_channels = batch[0][1].size(0)
+        spec_padded = pad_2d([x[1] for x in batch], torch.empty(b, spec_channels, int(spec_lengths.max())))
+        wav_padded = pad_2d([x[2] for x in batch], torch.empty(b, 1, int(wav_lengths.max())))
+        for i, x in enumerate(batch):
+            if not x[2].is_floating_point():
+                wav_padded[i].div_(self.max_wav_value)
+
+        streams = []
+        for index, dim in [(6, 1024), (7, 768)]:
+            mats = [x[index] for x in batch]
+            if all(x is None for x in mats):
+                streams.append(None)
+                continue
+            streams.append(pad_2d(mats, torch.empty(b, dim, max_text_len)))
+        bert_padded, ja_bert_padded = streams
 
         return (
             text_padded,
@@ -273,26 +316,58 @@ class DistributedBucketSampler(torch.utils.data.distributed.DistributedSampler):
 
     It removes samples which are not included in the boundaries.
     Ex) boundaries = [b1, b2, b3] -> any x s.t. length(x) <= b1 or length(x) > b3 are discarded.
+
+    With ``max_frames``, each bucket gets its own batch size ``max_frames // upper boundary``, so a batch
+    holds about the same number of frames whatever its lengths. Without ``boundaries``, ``num_buckets``
+    boundaries are taken from the length quantiles, keeping every sample. Every rank still sees the same
+    number of batches from each bucket.
     """
 
     def __init__(
         self,
         dataset,
         batch_size,
-        boundaries,
+        boundaries=None,
         num_replicas=None,
         rank=None,
         shuffle=True,
+        max_frames=None,
+        num_buckets=8,
     ):
         super().__init__(dataset, num_replicas=num_replicas, rank=rank, shuffle=shuffle)
         self.lengths = dataset.lengths
         self.batch_size = batch_size
-        self.boundaries = boundaries
+        self.max_frames = max_frames
+        if boundaries is None:
+            boundaries = self.quantile_boundaries(self.lengths, num_buckets)
+        self.boundaries = list(boundaries)
 
         self.buckets, self.num_samples_per_bucket = self._create_buckets()
         self.total_size = sum(self.num_samples_per_bucket)
         self.num_samples = self.total_size // self.num_replicas
-        print('buckets:', self.num_samples_per_bucket)
+        self.num_batches = sum(
+            n // (self.num_replicas * bs)
+            for n, bs in zip(self.num_samples_per_bucket, self.bucket_batch_sizes))
+        print('buckets:', self.num_samples_per_bucket, 'batch sizes:', self.bucket_batch_sizes)
+
+    @staticmethod
+    def quantile_boundaries(lengths, num_buckets):
+        """Boundaries splitting ``lengths`` into ``num_buckets`` groups of about the same size."""
+        if not lengths:
+            raise ValueError("No samples to bucket, every utterance was filtered out")
+        lengths = sorted(lengths)
+        n = len(lengths)
+        boundaries = [lengths[0] - 1]
+        for i in range(1, num_buckets + 1):
+            b = lengths[min(n - 1, (i * n) // num_buckets)] if i < num_buckets else lengths[-1]
+            if b > boundaries[-1]:
+                boundaries.append(b)
+        return boundaries
+
+    def _bucket_batch_size(self, i):
+        if self.max_frames is None:
+            return self.batch_size
+        return max(1, self.max_frames // self.boundaries[i + 1])
 
     def _create_buckets(self):
         buckets = [[] for _ in range(len(self.boundaries) - 1)]
@@ -316,10 +391,11 @@ class DistributedBucketSampler(torch.utils.data.distributed.DistributedSampler):
                     buckets.pop(i)
                     self.boundaries.pop(i + 1)
 
+        self.bucket_batch_sizes = [self._bucket_batch_size(i) for i in range(len(buckets))]
         num_samples_per_bucket = []
         for i in range(len(buckets)):
             len_bucket = len(buckets[i])
-            total_batch_size = self.num_replicas * self.batch_size
+            total_batch_size = self.num_replicas * self.bucket_batch_sizes[i]
             rem = (total_batch_size - (len_bucket % total_batch_size)) % total_batch_size
             num_samples_per_bucket.append(len_bucket + rem)
         return buckets, num_samples_per_bucket
@@ -354,8 +430,9 @@ class DistributedBucketSampler(torch.utils.data.distributed.DistributedSampler):
             ids_bucket = ids_bucket[self.rank::self.num_replicas]
 
             # batching
-            for j in range(len(ids_bucket) // self.batch_size):
-                batch = [bucket[idx] for idx in ids_bucket[j * self.batch_size:(j + 1) * self.batch_size]]
+            batch_size = self.bucket_batch_sizes[i]
+            for j in range(len(ids_bucket) // batch_size):
+                batch = [bucket[idx] for idx in ids_bucket[j * batch_size:(j + 1) * batch_size]]
                 batches.append(batch)
 
         if self.shuffle:
@@ -363,7 +440,7 @@ class DistributedBucketSampler(torch.utils.data.distributed.DistributedSampler):
             batches = [batches[i] for i in batch_ids]
         self.batches = batches
 
-        assert len(self.batches) * self.batch_size == self.num_samples
+        assert len(self.batches) == self.num_batches
         return iter(self.batches)
 
     def _bisect(self, x, lo=0, hi=None):
@@ -382,4 +459,4 @@ class DistributedBucketSampler(torch.utils.data.distributed.DistributedSampler):
             return -1
 
     def __len__(self):
-        return self.num_samples // self.batch_size
+        return self.num_batches
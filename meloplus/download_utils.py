@@ -68,3 +68,11 @@ def load_or_download_model(locale, device, use_hf=True, ckpt_path=None):
 
 def load_pretrain_model():
     return [cached_path(url) for url in PRETRAINED_MODELS.values()]
+
+
+def get_cache_dir(*subdirs):
+    default = os.path.join(os.path.expanduser("~"), ".cache", "meloplus")
+    cache_dir = os.environ.get("MELOPLUS_CACHE_DIR", default)
+    cache_dir = os.path.join(cache_dir, *subdirs)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
@@ -319,9 +319,16 @@ class TextEncoder(nn.Module):
         )
         self.proj = nn.Conv1d(hidden_channels, out_channels * 2, 1)
 
+    @staticmethod
+    def _bert_emb(proj, feats):
+        # an absent (None) stream stands for zero features, whose projection is just the bias
+        if feats is None:
+            return proj.bias
+        return proj(feats).transpose(1, 2)
+
     def forward(self, x, x_lengths, tone, language, bert, ja_bert, g=None):
-        bert_emb = self.bert_proj(bert).transpose(1, 2)
-        ja_bert_emb = self.ja_bert_proj(ja_bert).transpose(1, 2)
+        bert_emb = self._bert_emb(self.bert_proj, bert)
+        ja_bert_emb = self._bert_emb(self.ja_bert_proj, ja_bert)
         x = (self.emb(x) + self.tone_emb(tone) + self.language_emb(language) + bert_emb +
              ja_bert_emb) * math.sqrt(self.hidden_channels)  # [b, t, h]
         x = torch.transpose(x, 1, -1)  # [b, h, t]
@@ -745,6 +752,7 @@ class SynthesizerTrn(nn.Module):
         self.mas_noise_scale_initial = kwargs.get("mas_noise_scale_initial", 0.01)
         self.noise_scale_delta = kwargs.get("noise_scale_delta", 2e-6)
         self.current_mas_noise_scale = self.mas_noise_scale_initial
+        self.mas_impl = kwargs.get("mas_impl", "numba")
         if self.use_spk_conditioned_encoder and gin_channels > 0:
             self.enc_gin_channels = gin_channels
         else:
@@ -875,7 +883,8 @@ class SynthesizerTrn(nn.Module):
                 neg_cent = neg_cent + epsilon
 
             attn_mask = torch.unsqueeze(x_mask, 2) * torch.unsqueeze(y_mask, -1)
-            attn = (monotonic_align.maximum_path(neg_cent, attn_mask.squeeze(1)).unsqueeze(1).detach())
+            attn = monotonic_align.maximum_path(neg_cent, attn_mask.squeeze(1), impl=self.mas_impl)
+            attn = attn.unsqueeze(1).detach()
 
         w = attn.sum(2)
 
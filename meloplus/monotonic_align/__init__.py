@@ -1,10 +1,22 @@
+import torch
 from numpy import float32, int32, zeros
 from torch import from_numpy
 
-from .core import maximum_path_jit
+from .core import maximum_path_jit, maximum_path_jit_parallel
 
+MAS_IMPLS = ["numba", "numba_parallel", "torch"]
 
-def maximum_path(neg_cent, mask):
+
+def maximum_path(neg_cent, mask, impl="numba"):
+    """Monotonic alignment search over a batch; ``impl`` is one of ``MAS_IMPLS``.
+
+    ``numba`` runs the items one after the other on the CPU, ``numba_parallel`` spreads them over the numba
+    threads and ``torch`` runs the whole batch on the device of ``neg_cent``. All three return the same path.
+    """
+    if impl == "torch":
+        return maximum_path_torch(neg_cent, mask)
+    if impl not in MAS_IMPLS:
+        raise ValueError(f"Unknown MAS implementation {impl}, expected one of {MAS_IMPLS}")
     device = neg_cent.device
     dtype = neg_cent.dtype
     neg_cent = neg_cent.data.cpu().numpy().astype(float32)
@@ -12,5 +24,46 @@ def maximum_path(neg_cent, mask):
 
     t_t_max = mask.sum(1)[:, 0].data.cpu().numpy().astype(int32)
     t_s_max = mask.sum(2)[:, 0].data.cpu().numpy().astype(int32)
-    maximum_path_jit(path, neg_cent, t_t_max, t_s_max)
+    if impl == "numba_parallel":
+        maximum_path_jit_parallel(path, neg_cent, t_t_max, t_s_max)
+    else:
+        maximum_path_jit(path, neg_cent, t_t_max, t_s_max)
     return from_numpy(path).to(device=device, dtype=dtype)
+
+
+def maximum_path_torch(neg_cent, mask):
+    """``maximum_path`` with batched tensor ops, without leaving the device or synchronizing.
+
+    Row ``y`` of the accumulated values only depends on row ``y - 1``, so the forward pass and the
+    backtracking only loop over frames, handling every item and text position at once.
+    """
+    max_neg_val = -1e9
+    b, t_y, t_x = neg_cent.shape
+    device = neg_cent.device
+    value = neg_cent.detach().float()
+    t_ys = mask.sum(1)[:, 0].long()
+    t_xs = mask.sum(2)[:, 0].long()
+    positions = torch.arange(t_x, device=device)
+
+    # cells outside an item's valid band get meaningless values, but are never read for valid ones
+    acc = torch.empty_like(value)
+    prev = value.new_full((b, t_x), max_neg_val)
+    for y in range(t_y):
+        v_cur = prev.masked_fill(positions == y, max_neg_val)
+        v_prev = torch.nn.functional.pad(prev[:, :-1], (1, 0), value=0.0 if y == 0 else max_neg_val)
+        prev = acc[:, y] = value[:, y] + torch.maximum(v_prev, v_cur)
+
+    path = torch.zeros_like(value)
+    batch = torch.arange(b, device=device)
+    index = t_xs - 1
+    for y in range(t_y - 1, -1, -1):
+        active = t_ys > y
+        path[batch, y, index.clamp(min=0)] += active.float()
+        if y == 0:
+            break
+        row = acc[:, y - 1]
+        v_cur = row.gather(1, index.clamp(min=0).unsqueeze(1)).squeeze(1)
+        v_prev = row.gather(1, (index - 1).clamp(min=0).unsqueeze(1)).squeeze(1)
+        step = active & (index != 0) & ((index == y) | (v_cur < v_prev))
+        index = index - step.long()
+    return path.to(dtype=neg_cent.dtype)
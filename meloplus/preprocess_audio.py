@@ -0,0 +1,122 @@
+"""Offline audio preprocessing for training: run once before ``train.py`` instead of inside the DataLoader."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+import numpy as np
+import soundfile
+from tqdm import tqdm
+
+from data_utils import compute_spec, load_cached_spec, save_cached_spec, spec_cache_path, spec_signature
+from utils import get_hparams_from_file, load_filepaths_and_text, load_length_index, read_wav_header
+from utils import load_wav_to_torch_fast as load_wav_to_torch
+
+
+def _spec_job(audiopath, hparams, fp16, force):
+    spec_filename = spec_cache_path(audiopath, hparams)
+    signature = spec_signature(hparams)
+    audio_norm, _ = load_wav_to_torch(audiopath, hparams.sampling_rate)
+    audio_norm = audio_norm.unsqueeze(0)
+    if not force and load_cached_spec(spec_filename, signature, n_samples=audio_norm.size(-1)) is not None:
+        return False
+    save_cached_spec(spec_filename, compute_spec(audio_norm, hparams), signature, fp16=fp16)
+    return True
+
+
+def _resample_job(src, dst, sampling_rate, peak):
+    # an existing output with the target format is complete, since outputs are renamed into place
+    header = read_wav_header(dst) if os.path.exists(dst) else None
+    if header is not None and header[:4] == (1, 1, sampling_rate, 16):
+        return False
+    import librosa
+    audio, _ = librosa.load(src, sr=sampling_rate, mono=True)
+    if peak:
+        max_abs = np.abs(audio).max()
+        if max_abs > 0:
+            audio = audio * (peak / max_abs)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp_path = f"{dst}.{os.getpid()}.tmp"
+    audio = np.clip(audio, -1., 32767 / 32768)
+    soundfile.write(tmp_path, audio, sampling_rate, subtype="PCM_16", format="WAV")
+    os.replace(tmp_path, dst)
+    return True
+
+
+@click.group()
+def main():
+    pass
+
+
+@main.command()
+@click.option("--filelist", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--config", "config_path", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--output-dir", required=True, type=click.Path(file_okay=False))
+@click.option("--output-filelist", default=None, help="Defaults to OUTPUT_DIR/<filelist name>")
+@click.option("--peak", default=None, type=float, help="Peak-normalize each file to this amplitude")
+@click.option("--workers", default=os.cpu_count(), help="Worker processes")
+def resample(filelist, config_path, output_dir, output_filelist, peak, workers):
+    """Convert every wav in FILELIST once to mono 16-bit PCM at data.sampling_rate.
+
+    The directory layout is mirrored under OUTPUT_DIR and a filelist pointing to the new files is written.
+    Files that were already converted are skipped, so an interrupted run can be resumed.
+    """
+    hps = get_hparams_from_file(config_path)
+    lines = load_filepaths_and_text(filelist)
+    sources = sorted({os.path.abspath(line[0]) for line in lines})
+    root = os.path.commonpath([os.path.dirname(p) for p in sources])
+    targets = {
+        src: os.path.join(output_dir,
+                          os.path.splitext(os.path.relpath(src, root))[0] + ".wav")
+        for src in sources
+    }
+    n = len(sources)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = pool.map(
+            _resample_job,
+            sources, [targets[src] for src in sources], [hps.data.sampling_rate] * n, [peak] * n,
+            chunksize=16)
+        converted = sum(tqdm(jobs, total=n))
+    print(f"Resampled {converted} files, {n - converted} were already done")
+
+    if output_filelist is None:
+        output_filelist = os.path.join(output_dir, os.path.basename(filelist))
+    with open(output_filelist, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write("|".join([targets[os.path.abspath(line[0])]] + line[1:]) + "\n")
+
+
+@main.command()
+@click.option("--filelist", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--config", "config_path", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--workers", default=os.cpu_count(), help="Worker processes")
+@click.option(
+    "--fp16/--no-fp16", default=None, help="Store float16 spectrograms, defaults to data.spec_cache_fp16")
+@click.option("--force", is_flag=True, default=False, help="Recompute entries that are already valid")
+def spec(filelist, config_path, workers, fp16, force):
+    """Precompute the spectrogram cache of every wav in FILELIST; valid entries are kept."""
+    hps = get_hparams_from_file(config_path)
+    if fp16 is None:
+        fp16 = getattr(hps.data, "spec_cache_fp16", False)
+    audiopaths = sorted({line[0] for line in load_filepaths_and_text(filelist)})
+    n = len(audiopaths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = pool.map(_spec_job, audiopaths, [hps.data] * n, [fp16] * n, [force] * n, chunksize=16)
+        computed = sum(tqdm(jobs, total=n))
+    print(f"Computed {computed} spectrograms, {n - computed} were already cached")
+
+
+@main.command()
+@click.option("--filelist", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--config", "config_path", required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--workers", default=16, help="Threads reading the headers")
+def lengths(filelist, config_path, workers):
+    """Build or refresh the length index of FILELIST, checking every file for changes."""
+    hps = get_hparams_from_file(config_path)
+    audiopaths = [line[0] for line in load_filepaths_and_text(filelist)]
+    frames = load_length_index(
+        filelist, audiopaths, hps.data.sampling_rate, hps.data.hop_length, check_files=True, workers=workers)
+    print(f"Indexed {len(set(audiopaths))} files, {sum(frames)} frames in total")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import itertools
 import json
 import os
 from collections import defaultdict
@@ -6,13 +7,145 @@ from typing import Optional
 
 import click
 import torch
-from text.cleaner import clean_text_bert
+from text import get_bert_batch
+from text.cleaner import clean_text, clean_text_batch
 from text.symbols import num_languages, num_tones, symbols
 from tqdm import tqdm
 
 import meloplus
 
 
+def _done_utts(cleaned_path):
+    """Utterances already in the cleaned list; a line cut short by an interrupted run is dropped."""
+    done = set()
+    if not os.path.exists(cleaned_path):
+        return done
+    with open(cleaned_path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    for line in data[:end].decode("utf-8").splitlines():
+        done.add(line.split("|", 1)[0])
+    return done
+
+
+def _clean_group(texts, language, workers):
+    """``clean_text`` of every text, None for the ones that fail."""
+    try:
+        return clean_text_batch(texts, language, workers=workers)
+    except Exception:
+        # find the failing lines one by one
+        results = []
+        for text in texts:
+            try:
+                results.append(clean_text(text, language))
+            except Exception as error:
+                print("err!", text, error)
+                results.append(None)
+        return results
+
+
+def _bert_group(texts, word2phs, language, device, batch_size):
+    """BERT features of every text, None for the ones that fail."""
+    try:
+        return get_bert_batch(texts, word2phs, language, device, batch_size=batch_size)
+    except Exception:
+        # find the failing lines one by one
+        berts = []
+        for text, word2ph in zip(texts, word2phs):
+            try:
+                berts.extend(get_bert_batch([text], [word2ph], language, device, batch_size=1))
+            except Exception as error:
+                print("err!", text, error)
+                berts.append(None)
+        return berts
+
+
+def _save_bert(bert, bert_path):
+    os.makedirs(os.path.dirname(bert_path), exist_ok=True)
+    tmp_path = f"{bert_path}.{os.getpid()}.tmp"
+    torch.save(bert.cpu(), tmp_path)
+    os.replace(tmp_path, bert_path)
+
+
+def clean_corpus(metadata, cleaned_path, device, workers, bert_batch_size, chunk_size, resume):
+    """Write the cleaned list and ``.bert.pt`` files of ``metadata``, streaming it in chunks of lines.
+
+    Text normalization and G2P run in ``workers`` processes and BERT in batches. Each cleaned line is written
+    after its BERT features, so with ``resume`` the lines already in ``cleaned_path`` are skipped.
+    ``<cleaned_path>.failed`` is rewritten on every run: lines that failed before are retried and listed
+    again only if they still fail.
+    """
+    done = _done_utts(cleaned_path) if resume else set()
+    failed_path = cleaned_path + ".failed"
+    new_symbols = []
+    with open(metadata, encoding="utf-8") as f_in, \
+            open(cleaned_path, "a" if resume else "w", encoding="utf-8") as out_file, \
+            open(failed_path, "w", encoding="utf-8") as failed_file:
+        lines = (line for line in f_in if line.strip())
+        with tqdm(unit="utt") as pbar:
+            while True:
+                chunk = list(itertools.islice(lines, chunk_size))
+                if not chunk:
+                    break
+                pbar.update(len(chunk))
+                groups = defaultdict(list)
+                for line in chunk:
+                    try:
+                        utt, spk, language, text = line.strip().split("|")
+                    except ValueError as error:
+                        print("err!", line, error)
+                        failed_file.write(line)
+                        continue
+                    if utt not in done:
+                        groups[language].append((utt, spk, text))
+
+                for language, items in groups.items():
+                    cleaned = _clean_group([text for _, _, text in items], language, workers)
+                    ok = []
+                    for (utt, spk, text), result in zip(items, cleaned):
+                        valid = result is not None and len(result[1]) == len(result[2]) == sum(result[3])
+                        if not valid:
+                            failed_file.write(f"{utt}|{spk}|{language}|{text}\n")
+                            continue
+                        ok.append((utt, spk, text, result))
+                    # BERT is aligned to the sequence with blanks, as in clean_text_bert
+                    word2phs = []
+                    for _, _, _, (norm_text, phones, tones, word2ph) in ok:
+                        word2ph = [n * 2 for n in word2ph]
+                        word2ph[0] += 1
+                        word2phs.append(word2ph)
+                    berts = _bert_group([r[0] for _, _, _, r in ok], word2phs, language, device,
+                                        bert_batch_size)
+
+                    for (utt, spk, text, (norm_text, phones, tones, word2ph)), bert in zip(ok, berts):
+                        if bert is None:
+                            failed_file.write(f"{utt}|{spk}|{language}|{text}\n")
+                            continue
+                        for ph in phones:
+                            if ph not in symbols and ph not in new_symbols:
+                                new_symbols.append(ph)
+                                print('update!, now symbols:')
+                                print(new_symbols)
+                                with open(f'{language}_symbol.txt', 'w') as f:
+                                    f.write(f'{new_symbols}')
+                        _save_bert(bert, utt.replace(".wav", ".bert.pt"))
+                        out_file.write(
+                            "{}|{}|{}|{}|{}|{}|{}\n".format(
+                                utt,
+                                spk,
+                                language,
+                                norm_text,
+                                " ".join(phones),
+                                " ".join([str(i) for i in tones]),
+                                " ".join([str(i) for i in word2ph]),
+                            ))
+                # the cleaned list is the progress log: flush it once per chunk
+                out_file.flush()
+                failed_file.flush()
+
+
 @click.command()
 @click.option(
     "--metadata",
@@ -30,6 +163,11 @@ import meloplus
 @click.option("--val-per-spk", default=4)
 @click.option("--max-val-total", default=8)
 @click.option("--clean/--no-clean", default=True)
+@click.option("--device", default="cuda:0" if torch.cuda.is_available() else "cpu", help="Device for BERT")
+@click.option("--workers", default=os.cpu_count(), help="Processes for text normalization and G2P")
+@click.option("--bert-batch-size", default=16)
+@click.option("--chunk-size", default=1024, help="Lines read, cleaned and written at a time")
+@click.option("--resume/--no-resume", default=True, help="Skip utterances already in the cleaned list")
 def main(
     metadata: str,
     cleaned_path: Optional[str],
@@ -39,6 +177,11 @@ def main(
     val_per_spk: int,
     max_val_total: int,
     clean: bool,
+    device: str,
+    workers: int,
+    bert_batch_size: int,
+    chunk_size: int,
+    resume: bool,
 ):
     if train_path is None:
         train_path = os.path.join(os.path.dirname(metadata), 'train.list')
@@ -50,40 +193,7 @@ def main(
         cleaned_path = metadata + ".cleaned"
 
     if clean:
-        out_file = open(cleaned_path, "w", encoding="utf-8")
-        new_symbols = []
-        for line in tqdm(open(metadata, encoding="utf-8").readlines()):
-            try:
-                utt, spk, language, text = line.strip().split("|")
-                norm_text, phones, tones, word2ph, bert = clean_text_bert(text, language, device='cuda:0')
-                for ph in phones:
-                    if ph not in symbols and ph not in new_symbols:
-                        new_symbols.append(ph)
-                        print('update!, now symbols:')
-                        print(new_symbols)
-                        with open(f'{language}_symbol.txt', 'w') as f:
-                            f.write(f'{new_symbols}')
-
-                assert len(phones) == len(tones)
-                assert len(phones) == sum(word2ph)
-                out_file.write(
-                    "{}|{}|{}|{}|{}|{}|{}\n".format(
-                        utt,
-                        spk,
-                        language,
-                        norm_text,
-                        " ".join(phones),
-                        " ".join([str(i) for i in tones]),
-                        " ".join([str(i) for i in word2ph]),
-                    ))
-                bert_path = utt.replace(".wav", ".bert.pt")
-                os.makedirs(os.path.dirname(bert_path), exist_ok=True)
-                torch.save(bert.cpu(), bert_path)
-            except Exception as error:
-                print("err!", line, error)
-
-        out_file.close()
-
+        clean_corpus(metadata, cleaned_path, device, workers, bert_batch_size, chunk_size, resume)
         metadata = cleaned_path
 
     spk_utt_map = defaultdict(list)
@@ -1,3 +1,4 @@
+import functools
 import glob
 import os
 import re
@@ -6,6 +7,28 @@ import numpy as np
 import soundfile as sf
 import torchaudio
 
+# Punctuation rules applied in a single translate pass. Brackets, guillemets and all double quotes,
+# including “”, are deleted in split_sentences_latin.
+LATIN_TABLE = str.maketrans({
+    **dict.fromkeys("。！？；", "."),
+    "，": ",",
+    "‘": "'",
+    "’": "'",
+    **dict.fromkeys("“”<>()[]\"«»"),
+})
+ZH_TABLE = str.maketrans({**dict.fromkeys("。！？；", "."), "，": ","})
+ZH_WHITESPACE_RE = re.compile('[\n\t ]+')
+ZH_PUNCTUATION_RE = re.compile('([,.!?;])')
+WHITESPACE_RE = re.compile(r'\s+')
+PUNCTUATION_RE = re.compile(r'([,.?!])')
+# Where iter_sentences may cut a chunk without splitting a sentence
+SENTENCE_END_RE = re.compile(r'[。！？；\n]|[.!?](?=\s)')
+# Natural break points inside a sentence that is over the phone budget, tried in order
+CLAUSE_BREAK_RE = re.compile(r'(?<=[,;:，、；：])\s*')
+WORD_BREAK_RE = re.compile(r'\s+')
+# Languages written without spaces between words: pieces are joined without one and split in halves
+SPACELESS_LANGUAGES = {'ZH', 'JP', 'TH'}
+
 
 def split_sentence(text, min_len=10, language_str='EN'):
     if language_str in ['EN', 'FR', 'ES', 'SP']:
@@ -15,22 +38,138 @@ def split_sentence(text, min_len=10, language_str='EN'):
     return sentences
 
 
+def _find_cut(text):
+    """Position after the last sentence end in ``text``, falling back to the last space."""
+    cut = None
+    for m in SENTENCE_END_RE.finditer(text):
+        cut = m.end()
+    if not cut:
+        cut = text.rfind(' ') + 1
+    return cut or len(text)
+
+
+def iter_sentences(source, language_str='EN', min_len=10, chunk_size=65536):
+    """Generator version of ``split_sentence`` for book-length input.
+
+    ``source`` is a text, a file object or an iterable of strings (e.g. lines). Text is buffered up to
+    ``chunk_size`` characters, cut at the last sentence end and split with the same rules as
+    ``split_sentence``, so memory is bounded by one chunk instead of the whole input.
+    """
+    if isinstance(source, str):
+        source = [source[i:i + chunk_size] for i in range(0, len(source), chunk_size)]
+    elif hasattr(source, 'read'):
+        source = iter(functools.partial(source.read, chunk_size), '')
+
+    buffer = ''
+    for block in source:
+        buffer += block
+        while len(buffer) >= chunk_size:
+            cut = _find_cut(buffer)
+            if buffer[:cut].strip():
+                yield from split_sentence(buffer[:cut], min_len=min_len, language_str=language_str)
+            buffer = buffer[cut:]
+    if buffer.strip():
+        yield from split_sentence(buffer, min_len=min_len, language_str=language_str)
+
+
+def _merge_to_budget(pieces, count_phones, budget, joiner=' '):
+    """Join consecutive pieces while their phone count stays within ``budget``.
+
+    Returns ``(text, n_phones)`` pairs, where the count of a merged text is the sum of its pieces.
+    """
+    merged = []
+    current, current_phones = None, 0
+    for piece in pieces:
+        n = count_phones(piece)
+        if current is not None and current_phones + n <= budget:
+            current, current_phones = current + joiner + piece, current_phones + n
+            continue
+        if current is not None:
+            merged.append((current, current_phones))
+        current, current_phones = piece, n
+    if current is not None:
+        merged.append((current, current_phones))
+    return merged
+
+
+def _halve(piece):
+    mid = len(piece) // 2
+    return [piece[:mid], piece[mid:]]
+
+
+def _split_over_budget(piece, count_phones, max_phones, language_str):
+    """Split one piece at clause breaks, then at spaces (halves for ZH/JP/TH), into parts within budget."""
+    spaceless = language_str in SPACELESS_LANGUAGES
+    word_break = _halve if spaceless else WORD_BREAK_RE.split
+    for split in (CLAUSE_BREAK_RE.split, word_break):
+        parts = [p for p in split(piece) if p.strip()]
+        if len(parts) > 1:
+            break
+    else:
+        return [piece]
+
+    result = []
+    for part, n in _merge_to_budget(parts, count_phones, max_phones, joiner='' if spaceless else ' '):
+        if n > max_phones:
+            result += _split_over_budget(part, count_phones, max_phones, language_str)
+        else:
+            result.append(part)
+    return result
+
+
+def pack_pieces(pieces, count_phones, target_phones=200, max_phones=None, language_str='EN'):
+    """Merge or split sentence pieces toward a phone budget, keeping their order.
+
+    Consecutive pieces are merged while they stay within ``target_phones``; a piece over ``max_phones``
+    (default ``2 * target_phones``) is split at clause breaks, then at spaces, or in halves for languages
+    written without spaces. ``count_phones`` maps a text to its phone count, e.g.
+    ``lambda t: len(clean_text(t, language)[1])``; it is called once per distinct text.
+    """
+    max_phones = max_phones or 2 * target_phones
+    count_phones = functools.lru_cache(maxsize=None)(count_phones)
+    split = []
+    for piece in pieces:
+        if count_phones(piece) > max_phones:
+            split += _split_over_budget(piece, count_phones, max_phones, language_str)
+        else:
+            split.append(piece)
+
+    joiner = '' if language_str in SPACELESS_LANGUAGES else ' '
+    return [text for text, _ in _merge_to_budget(split, count_phones, target_phones, joiner=joiner)]
+
+
+def make_length_batches(lengths, max_batch_size=16, max_padded=None):
+    """Group item indices into batches of similar length.
+
+    Items are sorted by length and cut into batches of at most ``max_batch_size`` items whose padded size
+    (longest item times batch size) stays within ``max_padded`` when given. Returns lists of indices.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    batch = []
+    for i in order:
+        longest = max(lengths[i], lengths[batch[-1]]) if batch else lengths[i]
+        if batch and (len(batch) >= max_batch_size or
+                      (max_padded is not None and longest * (len(batch) + 1) > max_padded)):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
 def split_sentences_latin(text, min_len=10):
-    text = re.sub('[。！？；]', '.', text)
-    text = re.sub('[，]', ',', text)
-    text = re.sub('[“”]', '"', text)
-    text = re.sub('[‘’]', "'", text)
-    text = re.sub(r"[\<\>\(\)\[\]\"\«\»]+", "", text)
+    text = text.translate(LATIN_TABLE)
     return [item.strip() for item in txtsplit(text, 256, 512) if item.strip()]
 
 
 def split_sentences_zh(text, min_len=10):
-    text = re.sub('[。！？；]', '.', text)
-    text = re.sub('[，]', ',', text)
+    text = text.translate(ZH_TABLE)
     # 将文本中的换行符、空格和制表符替换为空格
-    text = re.sub('[\n\t ]+', ' ', text)
+    text = ZH_WHITESPACE_RE.sub(' ', text)
     # 在标点符号后添加一个空格
-    text = re.sub('([,.!?;])', r'\1 $#!', text)
+    text = ZH_PUNCTUATION_RE.sub(r'\1 $#!', text)
     # 分隔句子并去除前后空格
     # sentences = [s.strip() for s in re.split('(。|！|？|；)', text)]
     sentences = [s.strip() for s in text.split('$#!')]
@@ -104,11 +243,8 @@ def merge_short_sentences_zh(sens):
 
 def txtsplit(text, desired_length=100, max_length=200):
     """Split text it into chunks of a desired length trying to keep sentences intact."""
-    text = re.sub(r'\n\n+', '\n', text)
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[""]', '"', text)
-    text = re.sub(r'([,.?!])', r'\1 ', text)
-    text = re.sub(r'\s+', ' ', text)
+    # collapsing all whitespace last also collapses blank lines
+    text = WHITESPACE_RE.sub(' ', PUNCTUATION_RE.sub(r'\1 ', text))
 
     rv = []
     in_quote = False
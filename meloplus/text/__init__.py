@@ -1,3 +1,5 @@
+import importlib
+
 from .symbols import *
 
 _symbol_to_id = {s: i for i, s in enumerate(symbols)}
@@ -19,28 +21,69 @@ def cleaned_text_to_sequence(cleaned_text, tones, language, symbol_to_id=None):
     return phones, tones, lang_ids
 
 
+# model input carrying each language's BERT features; the other stream is left out (None)
+language_bert_stream_map = {
+    "ZH": "bert",
+    **{
+        lang: "ja_bert"
+        for lang in ["JP", "EN", "ZH_MIX_EN", "KR", "SP", "ES", "FR", "DE", "RU", "TH", "TR"]
+    },
+}
+
+
+def split_bert_streams(bert, language):
+    """``(bert, ja_bert)`` model inputs for features of ``language``, with None for the unused stream."""
+    stream = language_bert_stream_map.get(language)
+    if stream is None:
+        raise NotImplementedError(f"No BERT stream for language {language}")
+    return (bert, None) if stream == "bert" else (None, bert)
+
+
+def distribute_phone(n_phone, n_word):
+    """Spread ``n_phone`` phones over ``n_word`` tokens as evenly as possible, earlier tokens first.
+
+    Same result as repeatedly giving the next phone to the first token with the fewest phones.
+    """
+    if n_word == 0:
+        if n_phone > 0:
+            raise ValueError(f"Cannot distribute {n_phone} phones over 0 words")
+        return []
+    base, extra = divmod(n_phone, n_word)
+    return [base + 1] * extra + [base] * (n_word - extra)
+
+
+# language -> (module, function); only the requested language's BERT module is imported
+lang_bert_func_map = {
+    "ZH": ("chinese_bert", "get_bert_feature"),
+    "EN": ("english_bert", "get_bert_feature"),
+    "JP": ("japanese_bert", "get_bert_feature"),
+    'ZH_MIX_EN': ("chinese_mix", "get_bert_feature"),
+    'FR': ("french_bert", "get_bert_feature"),
+    'SP': ("spanish_bert", "get_bert_feature"),
+    'ES': ("spanish_bert", "get_bert_feature"),
+    "KR": ("korean", "get_bert_feature"),
+    "TH": ("thai", "get_bert_feature"),
+    "TR": ("turkish_bert", "get_bert_feature"),
+}
+
+
+def get_bert_batch(norm_texts, word2phs, language, device, batch_size=16):
+    """``get_bert`` of every ``(norm_text, word2ph)`` pair, with the BERT forward passes run in batches."""
+    from . import onnx_bert
+    if onnx_bert.is_enabled(device):
+        return [onnx_bert.get_bert_feature(t, w, language) for t, w in zip(norm_texts, word2phs)]
+
+    module_name, _ = lang_bert_func_map[language]
+    module = importlib.import_module(f".{module_name}", __name__)
+    return module.get_bert_feature_batch(list(norm_texts), list(word2phs), device, batch_size=batch_size)
+
+
 def get_bert(norm_text, word2ph, language, device):
-    from .chinese_bert import get_bert_feature as zh_bert
-    from .chinese_mix import get_bert_feature as zh_mix_en_bert
-    from .english_bert import get_bert_feature as en_bert
-    from .french_bert import get_bert_feature as fr_bert
-    from .japanese_bert import get_bert_feature as jp_bert
-    from .korean import get_bert_feature as kr_bert
-    from .spanish_bert import get_bert_feature as sp_bert
-    from .thai import get_bert_feature as th_bert
-    from .turkish import get_bert_feature as tr_bert
-
-    lang_bert_func_map = {
-        "ZH": zh_bert,
-        "EN": en_bert,
-        "JP": jp_bert,
-        'ZH_MIX_EN': zh_mix_en_bert,
-        'FR': fr_bert,
-        'SP': sp_bert,
-        'ES': sp_bert,
-        "KR": kr_bert,
-        "TH": th_bert,
-        "TR": tr_bert
-    }
-    bert = lang_bert_func_map[language](norm_text, word2ph, device)
+    from . import onnx_bert
+    if onnx_bert.is_enabled(device):
+        return onnx_bert.get_bert_feature(norm_text, word2ph, language)
+
+    module_name, func_name = lang_bert_func_map[language]
+    bert_func = getattr(importlib.import_module(f".{module_name}", __name__), func_name)
+    bert = bert_func(norm_text, word2ph, device)
     return bert
@@ -0,0 +1,55 @@
+"""Shared tokenizer loading and the batched version of the per-language ``get_bert_feature`` functions."""
+import functools
+import sys
+
+import torch
+from transformers import AutoTokenizer
+
+
+@functools.lru_cache(maxsize=None)
+def load_tokenizer(model_id):
+    """The tokenizer of ``model_id``, loaded once and shared by the frontends and BERT modules."""
+    return AutoTokenizer.from_pretrained(model_id)
+
+
+def resolve_device(device):
+    if (sys.platform == "darwin" and torch.backends.mps.is_available() and device == "cpu"):
+        device = "mps"
+    if not device:
+        device = "cuda"
+    return device
+
+
+def token_features(model, tokenizer, texts, device, batch_size=16):
+    """Third-to-last hidden states ``[n_tokens, dim]`` of each text, in padded batches of similar length."""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    features = [None] * len(texts)
+    with torch.no_grad():
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            inputs = tokenizer([texts[i] for i in batch], return_tensors="pt", padding=True)
+            lengths = inputs["attention_mask"].sum(-1).tolist()
+            for k in inputs:
+                inputs[k] = inputs[k].to(device)
+            res = model(**inputs, output_hidden_states=True)["hidden_states"][-3].cpu()
+            for j, i in enumerate(batch):
+                features[i] = res[j, :lengths[j]]
+    return features
+
+
+def phone_level_features(model, tokenizer, texts, word2phs, device, batch_size=16, strict=True):
+    """Same result as calling ``get_bert_feature(text, word2ph)`` for every pair, in batches.
+
+    On a token/word2ph length mismatch, ``strict=True`` raises, ``False`` warns and ``None`` does not check,
+    to match the ``get_bert_feature`` of the language.
+    """
+    results = []
+    for res, word2ph in zip(token_features(model, tokenizer, texts, device, batch_size), word2phs):
+        if strict is not None and res.size(0) != len(word2ph):
+            message = f"{res.size(0)}/{len(word2ph)}"
+            if strict:
+                raise AssertionError(message)
+            print(f"Warning: Mismatch in input lengths. Details: {message}")
+        word2ph = torch.as_tensor(word2ph)
+        results.append(res[:len(word2ph)].repeat_interleave(word2ph, dim=0).T)
+    return results
@@ -1,9 +1,13 @@
+import functools
 import os
 import re
 
 import cn2an
+import jieba
 from pypinyin import Style, lazy_pinyin
 
+from ..download_utils import get_cache_dir
+from .normalization import Replacer
 from .symbols import punctuation
 from .tone_sandhi import ToneSandhi
 
@@ -15,6 +19,13 @@ pinyin_to_symbol_map = {
 
 import jieba.posseg as psg
 
+# Load jieba's dictionary at import, from a prebuilt cache file, instead of on the first request
+jieba.dt.cache_file = os.path.join(get_cache_dir("jieba"), "jieba.cache")
+jieba.initialize()
+
+# (word, pos) -> (initials, finals after tone sandhi)
+G2P_CACHE_SIZE = int(os.environ.get("MELOPLUS_ZH_G2P_CACHE_SIZE", "65536"))
+
 rep_map = {
     "：": ",",
     "；": ",",
@@ -50,14 +61,15 @@ rep_map = {
 
 tone_modifier = ToneSandhi()
 
+# "嗯" and "呣" are not rep_map keys, so folding them into the same single pass keeps the result unchanged
+punctuation_replacer = Replacer({"嗯": "恩", "呣": "母", **rep_map})
+non_chinese_pattern = re.compile(r"[^\u4e00-\u9fa5" + "".join(punctuation) + r"]+")
 
-def replace_punctuation(text):
-    text = text.replace("嗯", "恩").replace("呣", "母")
-    pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
 
-    replaced_text = pattern.sub(lambda x: rep_map[x.group()], text)
+def replace_punctuation(text):
+    replaced_text = punctuation_replacer(text)
 
-    replaced_text = re.sub(r"[^\u4e00-\u9fa5" + "".join(punctuation) + r"]+", "", replaced_text)
+    replaced_text = non_chinese_pattern.sub("", replaced_text)
 
     return replaced_text
 
@@ -85,6 +97,19 @@ def _get_initials_finals(word):
     return initials, finals
 
 
+@functools.lru_cache(maxsize=G2P_CACHE_SIZE)
+def _word_initials_finals(word, pos):
+    initials, finals = _get_initials_finals(word)
+    finals = tone_modifier.modified_tone(word, pos, finals)
+    return tuple(initials), tuple(finals)
+
+
+def get_initials_finals(word, pos):
+    """Initials and tone-sandhi-modified finals of a segmented word, cached by ``(word, pos)``."""
+    initials, finals = _word_initials_finals(word, pos)
+    return list(initials), list(finals)
+
+
 def _g2p(segments):
     phones_list = []
     tones_list = []
@@ -101,8 +126,7 @@ def _g2p(segments):
                 import pdb
                 pdb.set_trace()
                 continue
-            sub_initials, sub_finals = _get_initials_finals(word)
-            sub_finals = tone_modifier.modified_tone(word, pos, sub_finals)
+            sub_initials, sub_finals = get_initials_finals(word, pos)
             initials.append(sub_initials)
             finals.append(sub_finals)
 
@@ -173,7 +197,7 @@ def text_normalize(text):
 
 
 def get_bert_feature(text, word2ph, device=None):
-    from text import chinese_bert
+    from . import chinese_bert
 
     return chinese_bert.get_bert_feature(text, word2ph, device=device)
 
@@ -1,21 +1,25 @@
 import sys
 
 import torch
-from transformers import AutoModelForMaskedLM, AutoTokenizer
+from transformers import AutoModelForMaskedLM
+
+from . import bert_utils
 
 # model_id = 'hfl/chinese-roberta-wwm-ext-large'
 local_path = "./bert/chinese-roberta-wwm-ext-large"
 
-tokenizers = {}
 models = {}
 
 
-def get_bert_feature(text, word2ph, device=None, model_id='hfl/chinese-roberta-wwm-ext-large'):
+def get_model(device, model_id='hfl/chinese-roberta-wwm-ext-large'):
     if model_id not in models:
         models[model_id] = AutoModelForMaskedLM.from_pretrained(model_id).to(device)
-        tokenizers[model_id] = AutoTokenizer.from_pretrained(model_id)
-    model = models[model_id]
-    tokenizer = tokenizers[model_id]
+    return models[model_id]
+
+
+def get_bert_feature(text, word2ph, device=None, model_id='hfl/chinese-roberta-wwm-ext-large'):
+    model = get_model(device, model_id)
+    tokenizer = bert_utils.load_tokenizer(model_id)
 
     if (sys.platform == "darwin" and torch.backends.mps.is_available() and device == "cpu"):
         device = "mps"
@@ -40,6 +44,25 @@ def get_bert_feature(text, word2ph, device=None, model_id='hfl/chinese-roberta-w
     return phone_level_feature.T
 
 
+def get_bert_feature_batch(
+    texts,
+    word2phs,
+    device=None,
+    model_id='hfl/chinese-roberta-wwm-ext-large',
+    batch_size=16,
+):
+    device = bert_utils.resolve_device(device)
+    # get_bert_feature does not check the lengths either
+    return bert_utils.phone_level_features(
+        get_model(device, model_id),
+        bert_utils.load_tokenizer(model_id),
+        texts,
+        word2phs,
+        device,
+        batch_size=batch_size,
+        strict=None)
+
+
 if __name__ == "__main__":
     import torch
 
@@ -3,9 +3,10 @@ import re
 
 import cn2an
 from pypinyin import Style, lazy_pinyin
-from transformers import AutoTokenizer
 
+from .bert_utils import load_tokenizer
 from .english import g2p as g2p_en
+from .normalization import Replacer
 # from text.symbols import punctuation
 from .symbols import language_tone_start_map
 from .tone_sandhi import ToneSandhi
@@ -54,13 +55,15 @@ rep_map = {
 
 tone_modifier = ToneSandhi()
 
+punctuation_replacer = Replacer({"嗯": "恩", "呣": "母", **rep_map})
+non_mix_pattern = re.compile(r"[^\u4e00-\u9fa5_a-zA-Z\s" + "".join(punctuation) + r"]+")
+whitespace_pattern = re.compile(r"[\s]+")
+
 
 def replace_punctuation(text):
-    text = text.replace("嗯", "恩").replace("呣", "母")
-    pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
-    replaced_text = pattern.sub(lambda x: rep_map[x.group()], text)
-    replaced_text = re.sub(r"[^\u4e00-\u9fa5_a-zA-Z\s" + "".join(punctuation) + r"]+", "", replaced_text)
-    replaced_text = re.sub(r"[\s]+", " ", replaced_text)
+    replaced_text = punctuation_replacer(text)
+    replaced_text = non_mix_pattern.sub("", replaced_text)
+    replaced_text = whitespace_pattern.sub(" ", replaced_text)
 
     return replaced_text
 
@@ -95,7 +98,6 @@ def _get_initials_finals(word):
 
 
 model_id = 'bert-base-multilingual-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
 
 
 def _g2p(segments):
@@ -114,8 +116,7 @@ def _g2p(segments):
                 initials.append(['EN_WORD'])
                 finals.append([word])
             else:
-                sub_initials, sub_finals = _get_initials_finals(word)
-                sub_finals = tone_modifier.modified_tone(word, pos, sub_finals)
+                sub_initials, sub_finals = get_initials_finals(word, pos)
                 initials.append(sub_initials)
                 finals.append(sub_finals)
 
@@ -125,7 +126,7 @@ def _g2p(segments):
         #
         for c, v in zip(initials, finals):
             if c == 'EN_WORD':
-                tokenized_en = tokenizer.tokenize(v)
+                tokenized_en = load_tokenizer(model_id).tokenize(v)
                 phones_en, tones_en, word2ph_en = g2p_en(
                     text=None, pad_start_end=False, tokenized=tokenized_en)
                 # apply offset to tones_en
@@ -201,7 +202,14 @@ def get_bert_feature(text, word2ph, device):
         text, word2ph, model_id='bert-base-multilingual-uncased', device=device)
 
 
+def get_bert_feature_batch(texts, word2phs, device, batch_size=16):
+    from . import chinese_bert
+    return chinese_bert.get_bert_feature_batch(
+        texts, word2phs, model_id='bert-base-multilingual-uncased', device=device, batch_size=batch_size)
+
+
 from .chinese import _g2p as _chinese_g2p
+from .chinese import get_initials_finals
 
 
 def _g2p_v2(segments):
@@ -221,7 +229,7 @@ def _g2p_v2(segments):
         for text in texts:
             if re.match(r'[a-zA-Z\s]+', text):
                 # english
-                tokenized_en = tokenizer.tokenize(text)
+                tokenized_en = load_tokenizer(model_id).tokenize(text)
                 phones_en, tones_en, word2ph_en = g2p_en(
                     text=None, pad_start_end=False, tokenized=tokenized_en)
                 # apply offset to tones_en
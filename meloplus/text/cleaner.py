@@ -1,30 +1,40 @@
+import atexit
 import copy
+import importlib
+import math
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-from . import chinese, chinese_mix, cleaned_text_to_sequence, english, french, japanese, korean, spanish, thai, turkish
+from . import cleaned_text_to_sequence, get_bert
 
+# Language modules are imported on first use, so a worker only pays for the frontends it serves
 language_module_map = {
-    "ZH": chinese,
-    "JP": japanese,
-    "EN": english,
-    'ZH_MIX_EN': chinese_mix,
-    'KR': korean,
-    'FR': french,
-    'SP': spanish,
-    'ES': spanish,
-    'TH': thai,
-    'TR': turkish
+    "ZH": "chinese",
+    "JP": "japanese",
+    "EN": "english",
+    'ZH_MIX_EN': "chinese_mix",
+    'KR': "korean",
+    'FR': "french",
+    'SP': "spanish",
+    'ES': "spanish",
+    'TH': "thai",
+    'TR': "turkish"
 }
 
 
+def get_language_module(language):
+    return importlib.import_module(f".{language_module_map[language]}", __package__)
+
+
 def clean_text(text, language):
-    language_module = language_module_map[language]
+    language_module = get_language_module(language)
     norm_text = language_module.text_normalize(text)
     phones, tones, word2ph = language_module.g2p(norm_text)
     return norm_text, phones, tones, word2ph
 
 
 def clean_text_bert(text, language, device=None):
-    language_module = language_module_map[language]
+    language_module = get_language_module(language)
     norm_text = language_module.text_normalize(text)
     phones, tones, word2ph = language_module.g2p(norm_text)
 
@@ -32,11 +42,72 @@ def clean_text_bert(text, language, device=None):
     for i in range(len(word2ph)):
         word2ph[i] = word2ph[i] * 2
     word2ph[0] += 1
-    bert = language_module.get_bert_feature(norm_text, word2ph, device=device)
+    bert = get_bert(norm_text, word2ph, language, device)
 
     return norm_text, phones, tones, word2ph_bak, bert
 
 
+# Run once by every pool worker so that tokenizers, dictionaries and taggers are loaded before the first batch
+warmup_texts = {
+    "ZH": "你好，世界。",
+    "JP": "こんにちは、世界。",
+    "EN": "Hello, world.",
+    'ZH_MIX_EN': "你好, hello world.",
+    'KR': "안녕하세요, 세계.",
+    'FR': "Bonjour le monde.",
+    'SP': "Hola, mundo.",
+    'ES': "Hola, mundo.",
+    'TH': "สวัสดีชาวโลก",
+    'TR': "Merhaba dünya.",
+}
+
+# (language, workers) -> ProcessPoolExecutor, kept alive across clean_text_batch calls
+pools = {}
+
+
+def _init_worker(language):
+    try:
+        clean_text(warmup_texts[language], language)
+    except Exception as e:
+        print(f"Failed to warm up the {language} frontend: {e}")
+
+
+def get_pool(language, workers):
+    key = (language, workers)
+    if key not in pools:
+        pools[key] = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(language, ))
+    return pools[key]
+
+
+def shutdown_pools():
+    for pool in pools.values():
+        pool.shutdown(wait=True)
+    pools.clear()
+
+
+atexit.register(shutdown_pools)
+
+
+def clean_text_batch(texts, language, workers=1, chunksize=None):
+    """``clean_text`` of every text, returned in order.
+
+    With ``workers > 1`` the texts are sent in chunks to a persistent pool of worker processes whose
+    frontend is initialized once, so G2P can use several cores.
+    """
+    texts = list(texts)
+    if workers <= 1 or len(texts) <= 1:
+        return [clean_text(text, language) for text in texts]
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(texts) / (workers * 4)))
+    pool = get_pool(language, workers)
+    try:
+        return list(pool.map(clean_text, texts, [language] * len(texts), chunksize=chunksize))
+    except BrokenProcessPool:
+        # a worker died, start a fresh pool on the next call
+        pools.pop((language, workers), None)
+        raise
+
+
 def text_to_sequence(text, language):
     norm_text, phones, tones, word2ph = clean_text(text, language)
     return cleaned_text_to_sequence(phones, tones, language)
@@ -0,0 +1,171 @@
+"""Compact, memory-mapped CMU pronouncing dictionary.
+
+``cmudict.rep`` is compiled once into a flat binary file: sorted utf-8 keys with uint32 offsets, and a
+uint8 phone-id array (0 separates syllables) with uint32 offsets per word. The file is opened with
+``mmap`` so worker processes share the same pages instead of each unpickling ~130k Python objects.
+"""
+import array
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"MPLEX001"
+HEADER = struct.Struct("<8s8sQQQQ")
+SYLLABLE_SEP = 0
+
+
+def read_cmudict(path, start_line=49):
+    g2p_dict = {}
+    with open(path) as f:
+        for line_index, line in enumerate(f, 1):
+            if line_index < start_line:
+                continue
+            word_split = line.strip().split("  ")
+            g2p_dict[word_split[0]] = [syllable.split(" ") for syllable in word_split[1].split(" - ")]
+    return g2p_dict
+
+
+def _pad4(data):
+    return data + b"\0" * (-len(data) % 4)
+
+
+def build_lexicon(g2p_dict):
+    """Serialize ``{word: [[phone, ...], ...]}`` into the binary lexicon layout."""
+    words = sorted((word.encode("utf-8"), word) for word in g2p_dict)
+    symbols = sorted({ph for syllables in g2p_dict.values() for syllable in syllables for ph in syllable})
+    if len(symbols) > 255:
+        raise ValueError(f"Too many phone symbols for the lexicon: {len(symbols)}")
+    symbol_ids = {s: i + 1 for i, s in enumerate(symbols)}
+
+    key_offsets = array.array("I", [0])
+    entry_offsets = array.array("I", [0])
+    keys = bytearray()
+    phones = bytearray()
+    for key, word in words:
+        keys += key
+        key_offsets.append(len(keys))
+        for i, syllable in enumerate(g2p_dict[word]):
+            if i > 0:
+                phones.append(SYLLABLE_SEP)
+            phones += bytes(symbol_ids[ph] for ph in syllable)
+        entry_offsets.append(len(phones))
+
+    symbol_bytes = "\n".join(symbols).encode("utf-8")
+    header = HEADER.pack(
+        MAGIC, sys.byteorder.encode("ascii"), len(words), len(keys), len(phones), len(symbol_bytes))
+    return b"".join([
+        header,
+        key_offsets.tobytes(),
+        _pad4(bytes(keys)),
+        entry_offsets.tobytes(),
+        _pad4(bytes(phones)),
+        symbol_bytes,
+    ])
+
+
+class _Keys:
+    """Sequence view of the sorted keys, so ``bisect`` can search the mapped file directly."""
+
+    def __init__(self, buffer, base, offsets):
+        self.buffer = buffer
+        self.base = base
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        # slicing the mmap (or bytes) object itself yields comparable bytes
+        return self.buffer[self.base + self.offsets[i]:self.base + self.offsets[i + 1]]
+
+
+class CmuLexicon:
+    """Read-only mapping ``word -> [[phone, ...], ...]`` with the semantics of the parsed ``cmudict.rep``."""
+
+    def __init__(self, buffer, refine=None):
+        self.buffer = buffer
+        view = memoryview(buffer)
+        magic, byteorder, n_words, n_key_bytes, n_phones, n_symbol_bytes = HEADER.unpack_from(view)
+        if magic != MAGIC or byteorder.rstrip(b"\0").decode("ascii") != sys.byteorder:
+            raise ValueError("Not a lexicon file for this platform")
+
+        pos = HEADER.size
+        key_offsets = view[pos:pos + 4 * (n_words + 1)].cast("I")
+        pos += 4 * (n_words + 1)
+        self.keys = _Keys(buffer, pos, key_offsets)
+        pos += n_key_bytes + (-n_key_bytes % 4)
+        self.entry_offsets = view[pos:pos + 4 * (n_words + 1)].cast("I")
+        pos += 4 * (n_words + 1)
+        self.phones = view[pos:pos + n_phones]
+        pos += n_phones + (-n_phones % 4)
+        self.symbols = [None] + bytes(view[pos:pos + n_symbol_bytes]).decode("utf-8").split("\n")
+        # refine_ph is applied once per phone symbol rather than once per looked up phone
+        self.refined_symbols = [None] + [refine(s) for s in self.symbols[1:]] if refine else None
+
+    @classmethod
+    def load(cls, source_path, cache_path, refine=None):
+        """Map ``cache_path``, compiling it from ``source_path`` first if it does not exist yet."""
+        if not os.path.exists(cache_path):
+            data = build_lexicon(read_cmudict(source_path))
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                # read-only location: keep the compiled lexicon in memory for this process
+                return cls(data, refine)
+        with open(cache_path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(buffer, refine)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        for i in range(len(self.keys)):
+            yield self.keys[i].decode("utf-8")
+
+    def index(self, word):
+        key = word.encode("utf-8")
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return -1
+
+    def __contains__(self, word):
+        return self.index(word) >= 0
+
+    def _phone_ids(self, word):
+        i = self.index(word)
+        if i < 0:
+            raise KeyError(word)
+        return self.phones[self.entry_offsets[i]:self.entry_offsets[i + 1]]
+
+    def __getitem__(self, word):
+        syllables = [[]]
+        for phone_id in self._phone_ids(word):
+            if phone_id == SYLLABLE_SEP:
+                syllables.append([])
+            else:
+                syllables[-1].append(self.symbols[phone_id])
+        return syllables
+
+    def get(self, word, default=None):
+        try:
+            return self[word]
+        except KeyError:
+            return default
+
+    def refined(self, word):
+        """Same result as ``refine_syllables(lexicon[word])``, from the precomputed refined symbols."""
+        phonemes = []
+        tones = []
+        for phone_id in self._phone_ids(word):
+            if phone_id != SYLLABLE_SEP:
+                phoneme, tone = self.refined_symbols[phone_id]
+                phonemes.append(phoneme)
+                tones.append(tone)
+        return phonemes, tones
@@ -1,20 +1,32 @@
+import functools
 import os
-import pickle
 import re
+import tempfile
 
-from g2p_en import G2p
-from transformers import AutoTokenizer
-
-from . import symbols
+from ..download_utils import get_cache_dir
+from . import distribute_phone, symbols
+from .bert_utils import load_tokenizer
+from .cmudict_lexicon import CmuLexicon, read_cmudict
 from .english_utils.abbreviations import expand_abbreviations
 from .english_utils.number_norm import normalize_numbers
 from .english_utils.time_norm import expand_time_english
-from .japanese import distribute_phone
 
 current_file_path = os.path.dirname(__file__)
 CMU_DICT_PATH = os.path.join(current_file_path, "cmudict.rep")
-CACHE_PATH = os.path.join(current_file_path, "cmudict_cache.pickle")
-_g2p = G2p()
+# Word-level pronunciation memo, and an optional TSV file persisting the neural g2p results of OOV words
+G2P_CACHE_SIZE = int(os.environ.get("MELOPLUS_EN_G2P_CACHE_SIZE", "65536"))
+OOV_LEXICON_PATH = os.environ.get("MELOPLUS_EN_OOV_LEXICON")
+_g2p = None
+
+
+def get_g2p():
+    global _g2p
+    if _g2p is None:
+        from g2p_en import G2p
+
+        _g2p = G2p()
+    return _g2p
+
 
 arpa = {
     "AH0",
@@ -114,47 +126,28 @@ def post_replace_ph(ph):
     return ph
 
 
-def read_dict():
-    g2p_dict = {}
-    start_line = 49
-    with open(CMU_DICT_PATH) as f:
-        line = f.readline()
-        line_index = 1
-        while line:
-            if line_index >= start_line:
-                line = line.strip()
-                word_split = line.split("  ")
-                word = word_split[0]
-
-                syllable_split = word_split[1].split(" - ")
-                g2p_dict[word] = []
-                for syllable in syllable_split:
-                    phone_split = syllable.split(" ")
-                    g2p_dict[word].append(phone_split)
+def read_dict(path=CMU_DICT_PATH):
+    return read_cmudict(path)
 
-            line_index = line_index + 1
-            line = f.readline()
 
-    return g2p_dict
+def get_lexicon_path(path=CMU_DICT_PATH):
+    stat = os.stat(path)
+    try:
+        cache_dir = get_cache_dir("lexicon")
+    except OSError:
+        # unwritable cache root: CmuLexicon.load keeps the lexicon in memory if the temp dir fails too
+        cache_dir = tempfile.gettempdir()
+    return os.path.join(cache_dir, f"cmudict-{stat.st_size}-{stat.st_mtime_ns}.lex")
 
 
-def cache_dict(g2p_dict, file_path):
-    with open(file_path, "wb") as pickle_file:
-        pickle.dump(g2p_dict, pickle_file)
+eng_dict = None
 
 
 def get_dict():
-    if os.path.exists(CACHE_PATH):
-        with open(CACHE_PATH, "rb") as pickle_file:
-            g2p_dict = pickle.load(pickle_file)
-    else:
-        g2p_dict = read_dict()
-        cache_dict(g2p_dict, CACHE_PATH)
-
-    return g2p_dict
-
-
-eng_dict = get_dict()
+    global eng_dict
+    if eng_dict is None:
+        eng_dict = CmuLexicon.load(CMU_DICT_PATH, get_lexicon_path(), refine=refine_ph)
+    return eng_dict
 
 
 def refine_ph(phn):
@@ -186,30 +179,81 @@ def text_normalize(text):
 
 
 model_id = 'bert-base-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
+
+oov_lexicon = None
+
+
+def set_oov_lexicon(path):
+    """Persist neural g2p pronunciations of OOV words to ``path`` (a TSV file), or disable it with None."""
+    global OOV_LEXICON_PATH, oov_lexicon
+    OOV_LEXICON_PATH = path
+    oov_lexicon = None
+    word_to_phonemes.cache_clear()
+
+
+def get_oov_lexicon():
+    global oov_lexicon
+    if oov_lexicon is None and OOV_LEXICON_PATH is not None:
+        oov_lexicon = {}
+        if os.path.exists(OOV_LEXICON_PATH):
+            with open(OOV_LEXICON_PATH, encoding="utf-8") as f:
+                for line in f:
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) != 3:
+                        continue
+                    word, phones, tones = fields
+                    oov_lexicon[word] = (tuple(phones.split(" ")), tuple(int(t) for t in tones.split(" ")))
+    return oov_lexicon
+
+
+def save_oov_word(word, phones, tones):
+    if not phones or any(c in word for c in "\t\n"):
+        return
+    line = f"{word}\t{' '.join(phones)}\t{' '.join(map(str, tones))}\n"
+    # a single short append is atomic, so several workers can share the file
+    with open(OOV_LEXICON_PATH, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+@functools.lru_cache(maxsize=G2P_CACHE_SIZE)
+def word_to_phonemes(word):
+    """Refined (phones, tones) of one word, from the CMU dict, the OOV lexicon or the neural g2p."""
+    eng_dict = get_dict()
+    if word.upper() in eng_dict:
+        phns, tns = eng_dict.refined(word.upper())
+        return tuple(phns), tuple(tns)
+
+    oov_lexicon = get_oov_lexicon()
+    if oov_lexicon is not None and word in oov_lexicon:
+        return oov_lexicon[word]
+
+    phones = []
+    tones = []
+    phone_list = list(filter(lambda p: p != " ", get_g2p()(word)))
+    for ph in phone_list:
+        if ph in arpa:
+            ph, tn = refine_ph(ph)
+            phones.append(ph)
+            tones.append(tn)
+        else:
+            phones.append(ph)
+            tones.append(0)
+    phones, tones = tuple(phones), tuple(tones)
+    if oov_lexicon is not None:
+        oov_lexicon[word] = (phones, tones)
+        save_oov_word(word, phones, tones)
+    return phones, tones
 
 
 def g2p_old(text):
-    tokenized = tokenizer.tokenize(text)
     # import pdb; pdb.set_trace()
     phones = []
     tones = []
     words = re.split(r"([,;.\-\?\!\s+])", text)
     for w in words:
-        if w.upper() in eng_dict:
-            phns, tns = refine_syllables(eng_dict[w.upper()])
-            phones += phns
-            tones += tns
-        else:
-            phone_list = list(filter(lambda p: p != " ", _g2p(w)))
-            for ph in phone_list:
-                if ph in arpa:
-                    ph, tn = refine_ph(ph)
-                    phones.append(ph)
-                    tones.append(tn)
-                else:
-                    phones.append(ph)
-                    tones.append(0)
+        phns, tns = word_to_phonemes(w)
+        phones += phns
+        tones += tns
     # todo: implement word2ph
     word2ph = [1 for i in phones]
 
@@ -219,7 +263,7 @@ def g2p_old(text):
 
 def g2p(text, pad_start_end=True, tokenized=None):
     if tokenized is None:
-        tokenized = tokenizer.tokenize(text)
+        tokenized = load_tokenizer(model_id).tokenize(text)
     # import pdb; pdb.set_trace()
     phs = []
     ph_groups = []
@@ -234,24 +278,11 @@ def g2p(text, pad_start_end=True, tokenized=None):
     word2ph = []
     for group in ph_groups:
         w = "".join(group)
-        phone_len = 0
         word_len = len(group)
-        if w.upper() in eng_dict:
-            phns, tns = refine_syllables(eng_dict[w.upper()])
-            phones += phns
-            tones += tns
-            phone_len += len(phns)
-        else:
-            phone_list = list(filter(lambda p: p != " ", _g2p(w)))
-            for ph in phone_list:
-                if ph in arpa:
-                    ph, tn = refine_ph(ph)
-                    phones.append(ph)
-                    tones.append(tn)
-                else:
-                    phones.append(ph)
-                    tones.append(0)
-                phone_len += 1
+        phns, tns = word_to_phonemes(w)
+        phones += phns
+        tones += tns
+        phone_len = len(phns)
         aaa = distribute_phone(phone_len, word_len)
         word2ph += aaa
     phones = [post_replace_ph(i) for i in phones]
@@ -264,7 +295,7 @@ def g2p(text, pad_start_end=True, tokenized=None):
 
 
 def get_bert_feature(text, word2ph, device=None):
-    from text import english_bert
+    from . import english_bert
 
     return english_bert.get_bert_feature(text, word2ph, device=device)
 
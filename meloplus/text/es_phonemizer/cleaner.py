@@ -3,6 +3,8 @@
 
 import re
 
+from ..normalization import Replacer
+
 # Regular expression matching whitespace:
 _whitespace_re = re.compile(r"\s+")
 
@@ -40,11 +42,11 @@ rep_map = {
     "」": "'",
 }
 
+punctuation_replacer = Replacer(rep_map)
+
 
 def replace_punctuation(text):
-    pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
-    replaced_text = pattern.sub(lambda x: rep_map[x.group()], text)
-    return replaced_text
+    return punctuation_replacer(text)
 
 
 def lowercase(text):
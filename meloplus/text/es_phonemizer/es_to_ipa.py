@@ -1,13 +1,30 @@
+import functools
+
+from ..gruut_words import ipa_words
 from .cleaner import spanish_cleaners
 from .gruut_wrapper import Gruut
 
+phonemizer = None
+
+
+def get_phonemizer():
+    global phonemizer
+    if phonemizer is None:
+        phonemizer = Gruut(language="es-es", keep_puncs=True, keep_stress=True, use_espeak_phonemes=True)
+    return phonemizer
 
+
+@functools.lru_cache(maxsize=65536)
 def es2ipa(text):
-    e = Gruut(language="es-es", keep_puncs=True, keep_stress=True, use_espeak_phonemes=True)
     # text = spanish_cleaners(text)
-    phonemes = e.phonemize(text, separator="")
+    phonemes = get_phonemizer().phonemize(text, separator="")
     return phonemes
 
 
+def es2ipa_words(words):
+    """IPA of every word, with the alphabetic words phonemized in a single gruut pass."""
+    return ipa_words(words, get_phonemizer(), es2ipa)
+
+
 if __name__ == '__main__':
     print(es2ipa('¿Y a quién echaría de menos, en el mundo si no fuese a vos?'))
@@ -3,6 +3,7 @@
 
 import re
 
+from ..normalization import Replacer
 from .french_abbreviations import abbreviations_fr
 
 # Regular expression matching whitespace:
@@ -44,11 +45,11 @@ rep_map = {
     "¡": ""
 }
 
+punctuation_replacer = Replacer(rep_map)
+
 
 def replace_punctuation(text):
-    pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
-    replaced_text = pattern.sub(lambda x: rep_map[x.group()], text)
-    return replaced_text
+    return punctuation_replacer(text)
 
 
 def expand_abbreviations(text, lang="fr"):
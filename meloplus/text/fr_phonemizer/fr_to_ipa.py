@@ -1,6 +1,18 @@
+import functools
+
+from ..gruut_words import ipa_words
 from .cleaner import french_cleaners
 from .gruut_wrapper import Gruut
 
+phonemizer = None
+
+
+def get_phonemizer():
+    global phonemizer
+    if phonemizer is None:
+        phonemizer = Gruut(language="fr-fr", keep_puncs=True, keep_stress=True, use_espeak_phonemes=True)
+    return phonemizer
+
 
 def remove_consecutive_t(input_str):
     result = []
@@ -21,11 +33,16 @@ def remove_consecutive_t(input_str):
     return ''.join(result)
 
 
+@functools.lru_cache(maxsize=65536)
 def fr2ipa(text):
-    e = Gruut(language="fr-fr", keep_puncs=True, keep_stress=True, use_espeak_phonemes=True)
     # text = french_cleaners(text)
-    phonemes = e.phonemize(text, separator="")
+    phonemes = get_phonemizer().phonemize(text, separator="")
     # print(phonemes)
     phonemes = remove_consecutive_t(phonemes)
     # print(phonemes)
     return phonemes
+
+
+def fr2ipa_words(words):
+    """IPA of every word, with the alphabetic words phonemized in a single gruut pass."""
+    return ipa_words(words, get_phonemizer(), fr2ipa, postprocess=remove_consecutive_t)
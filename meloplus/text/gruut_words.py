@@ -0,0 +1,49 @@
+"""Phonemize all words of a sentence in one gruut pass, for the Spanish and French frontends."""
+import unicodedata
+
+import gruut
+from gruut_ipa import IPA
+
+# Table for str.translate to fix gruut/TTS phoneme mismatch, as in the Gruut wrappers
+GRUUT_TRANS_TABLE = str.maketrans("g", "ɡ")
+
+
+def phonemize_words(phonemizer, text, separator=""):
+    """``(word, phonemes)`` of every spoken word of ``text``, with the settings of a ``Gruut`` wrapper.
+
+    Breaks and punctuation are dropped so that the result can be aligned back to the input words.
+    """
+    words = []
+    for sentence in gruut.sentences(text, lang=phonemizer.language, espeak=phonemizer.use_espeak_phonemes):
+        for word in sentence:
+            if word.is_break or word.is_punctuation:
+                continue
+            word_phonemes = []
+            for word_phoneme in word.phonemes or []:
+                if not phonemizer.keep_stress:
+                    word_phoneme = IPA.without_stress(word_phoneme)
+                word_phoneme = word_phoneme.translate(GRUUT_TRANS_TABLE)
+                if word_phoneme:
+                    word_phonemes.extend(word_phoneme)
+            words.append((word.text, separator.join(word_phonemes)))
+    return words
+
+
+def _match_key(word):
+    word = unicodedata.normalize("NFD", word.casefold())
+    return "".join(c for c in word if not unicodedata.combining(c))
+
+
+def ipa_words(words, phonemizer, word_to_ipa, postprocess=None):
+    """IPA of every word, phonemizing all alphabetic words in a single gruut pass.
+
+    Other words (punctuation, numbers, ...) go through ``word_to_ipa``. If gruut splits or merges words so
+    that its output does not align with ``words``, every word goes through ``word_to_ipa`` instead.
+    ``postprocess`` is applied to the batched results, to match what ``word_to_ipa`` returns.
+    """
+    batch = [w for w in words if w.isalpha()]
+    results = phonemize_words(phonemizer, " ".join(batch)) if batch else []
+    if [_match_key(w) for w, _ in results] != [_match_key(w) for w in batch]:
+        return [word_to_ipa(w) for w in words]
+    batched = iter([postprocess(ipa) if postprocess else ipa for _, ipa in results])
+    return [next(batched) if w.isalpha() else word_to_ipa(w) for w in words]
@@ -1,11 +1,13 @@
 # Convert Japanese text to phonemes which is
 # compatible with Julius https://github.com/julius-speech/segmentation-kit
+import functools
 import re
+import threading
 import unicodedata
 
-from transformers import AutoTokenizer
-
-from . import symbols
+from . import distribute_phone, symbols
+from .bert_utils import load_tokenizer
+from .normalization import Replacer
 
 punctuation = ["!", "?", "…", ",", ".", "'", "-"]
 
@@ -329,28 +331,35 @@ def _makerulemap():
 
 
 _RULEMAP1, _RULEMAP2 = _makerulemap()
+# The rule maps with their phonemes already split, e.g. "ア" -> ("a",)
+_PHONEMES1 = {k: tuple(v.split(" ")[1:]) for k, v in _RULEMAP1.items()}
+_PHONEMES2 = {k: tuple(v.split(" ")[1:]) for k, v in _RULEMAP2.items()}
 
 
-def kata2phoneme(text: str) -> str:
-    """Convert katakana text to phonemes."""
-    text = text.strip()
+@functools.lru_cache(maxsize=65536)
+def _kata2phoneme(text):
     res = []
-    while text:
-        if len(text) >= 2:
-            x = _RULEMAP2.get(text[:2])
-            if x is not None:
-                text = text[2:]
-                res += x.split(" ")[1:]
-                continue
-        x = _RULEMAP1.get(text[0])
+    i = 0
+    while i < len(text):
+        # longest match first: two-character rules, then one-character rules
+        x = _PHONEMES2.get(text[i:i + 2])
         if x is not None:
-            text = text[1:]
-            res += x.split(" ")[1:]
+            res += x
+            i += 2
             continue
-        res.append(text[0])
-        text = text[1:]
+        x = _PHONEMES1.get(text[i])
+        if x is not None:
+            res += x
+        else:
+            res.append(text[i])
+        i += 1
+    return tuple(res)
+
+
+def kata2phoneme(text: str) -> str:
+    """Convert katakana text to phonemes."""
     # res = _COLON_RX.sub(":", res)
-    return res
+    return list(_kata2phoneme(text.strip()))
 
 
 _KATAKANA = "".join(chr(ch) for ch in range(ord("ァ"), ord("ン") + 1))
@@ -365,33 +374,40 @@ def hira2kata(text: str) -> str:
 
 _SYMBOL_TOKENS = set(list("・、。？！"))
 _NO_YOMI_TOKENS = set(list("「」『』―（）［］[]"))
-_TAGGER = MeCab.Tagger()
+# MeCab taggers must not be shared between threads, so every thread gets its own
+_TAGGERS = threading.local()
+
+
+def get_tagger():
+    tagger = getattr(_TAGGERS, "tagger", None)
+    if tagger is None:
+        tagger = _TAGGERS.tagger = MeCab.Tagger()
+    return tagger
+
+
+@functools.lru_cache(maxsize=65536)
+def morpheme_reading(word, feature):
+    """Katakana reading of a morpheme from its surface and MeCab feature string."""
+    yomi = feature.split(",")
+    if feature and len(yomi) > 6:
+        # a "*" reading is kept as is, like the original parse of MeCab's text output did
+        return yomi[6]
+    if word in _SYMBOL_TOKENS:
+        return word
+    elif word in ("っ", "ッ"):
+        return "ッ"
+    elif word in _NO_YOMI_TOKENS:
+        return ""
+    return word
 
 
 def text2kata(text: str) -> str:
-    parsed = _TAGGER.parse(text)
     res = []
-    for line in parsed.split("\n"):
-        if line == "EOS":
-            break
-        parts = line.split("\t")
-
-        word, yomi = parts[0], parts[1]
-        if yomi:
-            try:
-                res.append(yomi.split(',')[6])
-            except:
-                import pdb
-                pdb.set_trace()
-        else:
-            if word in _SYMBOL_TOKENS:
-                res.append(word)
-            elif word in ("っ", "ッ"):
-                res.append("ッ")
-            elif word in _NO_YOMI_TOKENS:
-                pass
-            else:
-                res.append(word)
+    node = get_tagger().parseToNode(text)
+    while node is not None:
+        if node.stat not in (MeCab.MECAB_BOS_NODE, MeCab.MECAB_EOS_NODE):
+            res.append(morpheme_reading(node.surface, node.feature))
+        node = node.next
     return hira2kata("".join(res))
 
 
@@ -521,30 +537,35 @@ rep_map = {
     "...": "…",
 }
 
+punctuation_replacer = Replacer(rep_map)
+non_japanese_pattern = re.compile(
+    r"[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF\u3400-\u4DBF" + "".join(punctuation) + r"]+")
 
-def replace_punctuation(text):
-    pattern = re.compile("|".join(re.escape(p) for p in rep_map.keys()))
 
-    replaced_text = pattern.sub(lambda x: rep_map[x.group()], text)
+def replace_punctuation(text):
+    replaced_text = punctuation_replacer(text)
 
-    replaced_text = re.sub(
-        r"[^\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF\u3400-\u4DBF" + "".join(punctuation) + r"]+",
-        "",
-        replaced_text,
-    )
+    replaced_text = non_japanese_pattern.sub("", replaced_text)
 
     return replaced_text
 
 
 from pykakasi import kakasi
 
-# Initialize kakasi object
-kakasi = kakasi()
-# Set options for converting Chinese characters to Katakana
-kakasi.setMode("J", "K")  # Chinese to Katakana
-kakasi.setMode("H", "K")  # Hiragana to Katakana
-# Convert Chinese characters to Katakana
-conv = kakasi.getConverter()
+conv = None
+
+
+def get_converter():
+    global conv
+    if conv is None:
+        # Initialize kakasi object
+        kks = kakasi()
+        # Set options for converting Chinese characters to Katakana
+        kks.setMode("J", "K")  # Chinese to Katakana
+        kks.setMode("H", "K")  # Hiragana to Katakana
+        # Convert Chinese characters to Katakana
+        conv = kks.getConverter()
+    return conv
 
 
 def text_normalize(text):
@@ -552,28 +573,18 @@ def text_normalize(text):
     res = japanese_convert_numbers_to_words(res)
     res = "".join([i for i in res if is_japanese_character(i)])
     res = replace_punctuation(res)
-    res = conv.do(res)
+    res = get_converter().do(res)
     return res
 
 
-def distribute_phone(n_phone, n_word):
-    phones_per_word = [0] * n_word
-    for task in range(n_phone):
-        min_tasks = min(phones_per_word)
-        min_index = phones_per_word.index(min_tasks)
-        phones_per_word[min_index] += 1
-    return phones_per_word
-
-
 # tokenizer = AutoTokenizer.from_pretrained('cl-tohoku/bert-base-japanese-v3')
 
 model_id = 'tohoku-nlp/bert-base-japanese-v3'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
 
 
 def g2p(norm_text):
 
-    tokenized = tokenizer.tokenize(norm_text)
+    tokenized = load_tokenizer(model_id).tokenize(norm_text)
     phs = []
     ph_groups = []
     for t in tokenized:
@@ -616,7 +627,7 @@ def g2p(norm_text):
 
 
 def get_bert_feature(text, word2ph, device):
-    from text import japanese_bert
+    from . import japanese_bert
 
     return japanese_bert.get_bert_feature(text, word2ph, device=device)
 
@@ -1,28 +1,26 @@
 import sys
 
 import torch
-from transformers import AutoModelForMaskedLM, AutoTokenizer
+from transformers import AutoModelForMaskedLM
+
+from . import bert_utils
 
 models = {}
-tokenizers = {}
 
 
-def get_bert_feature(text, word2ph, device=None, model_id='tohoku-nlp/bert-base-japanese-v3'):
-    global model
-    global tokenizer
+def get_model(device, model_id='tohoku-nlp/bert-base-japanese-v3'):
+    if model_id not in models:
+        models[model_id] = AutoModelForMaskedLM.from_pretrained(model_id).to(device)
+    return models[model_id]
+
 
+def get_bert_feature(text, word2ph, device=None, model_id='tohoku-nlp/bert-base-japanese-v3'):
     if (sys.platform == "darwin" and torch.backends.mps.is_available() and device == "cpu"):
         device = "mps"
     if not device:
         device = "cuda"
-    if model_id not in models:
-        model = AutoModelForMaskedLM.from_pretrained(model_id).to(device)
-        models[model_id] = model
-        tokenizer = AutoTokenizer.from_pretrained(model_id)
-        tokenizers[model_id] = tokenizer
-    else:
-        model = models[model_id]
-        tokenizer = tokenizers[model_id]
+    model = get_model(device, model_id)
+    tokenizer = bert_utils.load_tokenizer(model_id)
 
     with torch.no_grad():
         inputs = tokenizer(text, return_tensors="pt")
@@ -42,3 +40,20 @@ def get_bert_feature(text, word2ph, device=None, model_id='tohoku-nlp/bert-base-
     phone_level_feature = torch.cat(phone_level_feature, dim=0)
 
     return phone_level_feature.T
+
+
+def get_bert_feature_batch(
+    texts,
+    word2phs,
+    device=None,
+    model_id='tohoku-nlp/bert-base-japanese-v3',
+    batch_size=16,
+):
+    device = bert_utils.resolve_device(device)
+    return bert_utils.phone_level_features(
+        get_model(device, model_id),
+        bert_utils.load_tokenizer(model_id),
+        texts,
+        word2phs,
+        device,
+        batch_size=batch_size)
@@ -1,16 +1,18 @@
 # Convert Japanese text to phonemes which is
 # compatible with Julius https://github.com/julius-speech/segmentation-kit
+import functools
 import re
 import unicodedata
 
 from anyascii import anyascii
 from jamo import hangul_to_jamo
 from num2words import num2words
-from transformers import AutoTokenizer
 
 from meloplus.text.ko_dictionary import english_dictionary, etc_dictionary
 
-from . import punctuation, symbols
+from . import distribute_phone, punctuation, symbols
+from .bert_utils import load_tokenizer
+from .normalization import get_replacer
 
 
 def normalize(text):
@@ -23,10 +25,7 @@ def normalize(text):
 
 
 def normalize_with_dictionary(text, dic):
-    if any(key in text for key in dic.keys()):
-        pattern = re.compile("|".join(re.escape(key) for key in dic.keys()))
-        return pattern.sub(lambda x: dic[x.group()], text)
-    return text
+    return get_replacer(dic)(text)
 
 
 def normalize_english(text):
@@ -44,6 +43,16 @@ def normalize_english(text):
 g2p_kr = None
 
 
+def get_g2p_kr():
+    global g2p_kr  # pylint: disable=global-statement
+    if g2p_kr is None:
+        from g2pkk import G2p
+
+        g2p_kr = G2p()
+    return g2p_kr
+
+
+@functools.lru_cache(maxsize=65536)
 def korean_text_to_phonemes(text, character: str = "hangeul") -> str:
     """
 
@@ -55,11 +64,7 @@ def korean_text_to_phonemes(text, character: str = "hangeul") -> str:
         output = '하늘' (Unicode :\u1112\u1161\u1102\u1173\u11af), (ᄒ + ᅡ + ᄂ + ᅳ + ᆯ)
 
     """
-    global g2p_kr  # pylint: disable=global-statement
-    if g2p_kr is None:
-        from g2pkk import G2p
-
-        g2p_kr = G2p()
+    g2p_kr = get_g2p_kr()
 
     if character == "english":
         from anyascii import anyascii
@@ -74,6 +79,37 @@ def korean_text_to_phonemes(text, character: str = "hangeul") -> str:
     return "".join(text)
 
 
+def _is_hangul_syllable(char):
+    return "\uac00" <= char <= "\ud7a3"
+
+
+def sentence_group_phonemes(norm_text, texts):
+    """Jamo phonemes of each tokenizer word group from a single g2pkk call over the whole sentence.
+
+    g2pkk rewrites hangul syllable by syllable, so the converted sentence is aligned to the input by
+    position. Returns None when it is not (e.g. numbers or English were spelled out); a group that cannot
+    be found in the sentence gets None and is converted on its own.
+    """
+    source = unicodedata.normalize("NFC", normalize(norm_text))
+    converted = unicodedata.normalize("NFC", get_g2p_kr()(source))
+    if len(converted) != len(source):
+        return None
+    if any(a != b for a, b in zip(source, converted) if not _is_hangul_syllable(a)):
+        return None
+
+    phonemes = []
+    pos = 0
+    for text in texts:
+        text = unicodedata.normalize("NFC", text)
+        start = source.find(text, pos)
+        if start < 0:
+            phonemes.append(None)
+            continue
+        pos = start + len(text)
+        phonemes.append("".join(hangul_to_jamo(converted[start:pos])))
+    return phonemes
+
+
 def text_normalize(text):
     # res = unicodedata.normalize("NFKC", text)
     # res = japanese_convert_numbers_to_words(res)
@@ -83,23 +119,15 @@ def text_normalize(text):
     return text
 
 
-def distribute_phone(n_phone, n_word):
-    phones_per_word = [0] * n_word
-    for task in range(n_phone):
-        min_tasks = min(phones_per_word)
-        min_index = phones_per_word.index(min_tasks)
-        phones_per_word[min_index] += 1
-    return phones_per_word
-
-
 # tokenizer = AutoTokenizer.from_pretrained('cl-tohoku/bert-base-japanese-v3')
 
 model_id = 'kykim/bert-kor-base'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
 
 
-def g2p(norm_text):
-    tokenized = tokenizer.tokenize(norm_text)
+def g2p(norm_text, sentence_level=False):
+    """With ``sentence_level=True`` g2pkk runs once over the sentence, which keeps phonological rules across
+    word boundaries, and its output is aligned back to the tokenizer word groups."""
+    tokenized = load_tokenizer(model_id).tokenize(norm_text)
     phs = []
     ph_groups = []
     for t in tokenized:
@@ -107,6 +135,14 @@ def g2p(norm_text):
             ph_groups.append([t])
         else:
             ph_groups[-1].append(t.replace("#", ""))
+    group_phonemes = None
+    if sentence_level:
+        texts = ["".join(group) for group in ph_groups]
+        texts = [text for text in texts if text != '[UNK]' and text not in punctuation]
+        group_phonemes = sentence_group_phonemes(norm_text, texts)
+        if group_phonemes is not None:
+            group_phonemes = iter(group_phonemes)
+
     word2ph = []
     for group in ph_groups:
         text = ""
@@ -123,7 +159,9 @@ def g2p(norm_text):
         # import pdb; pdb.set_trace()
         # phonemes = japanese_text_to_phonemes(text)
         # text = g2p_kr(text)
-        phonemes = korean_text_to_phonemes(text)
+        phonemes = next(group_phonemes) if group_phonemes is not None else None
+        if phonemes is None:
+            phonemes = korean_text_to_phonemes(text)
         # import pdb; pdb.set_trace()
         # # phonemes = [i for i in phonemes if i in symbols]
         # for i in phonemes:
@@ -148,6 +186,12 @@ def get_bert_feature(text, word2ph, device='cuda'):
     return japanese_bert.get_bert_feature(text, word2ph, device=device, model_id=model_id)
 
 
+def get_bert_feature_batch(texts, word2phs, device='cuda', batch_size=16):
+    from . import japanese_bert
+    return japanese_bert.get_bert_feature_batch(
+        texts, word2phs, device=device, model_id=model_id, batch_size=batch_size)
+
+
 if __name__ == "__main__":
     # tokenizer = AutoTokenizer.from_pretrained("./bert/bert-base-japanese-v3")
     from text.symbols import symbols
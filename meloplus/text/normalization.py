@@ -0,0 +1,52 @@
+"""Replacement rules compiled once into single-pass ``str.translate`` tables or combined regexes.
+
+A ``Replacer`` gives the same result as the per-call idiom used by the frontends::
+
+    pattern = re.compile("|".join(re.escape(p) for p in rules.keys()))
+    pattern.sub(lambda x: rules[x.group()], text)
+
+but builds the pattern once and uses ``str.translate`` whenever the rules allow it.
+"""
+import re
+
+
+class Replacer:
+
+    def __init__(self, rules):
+        self.rules = dict(rules)
+        single = {k: v for k, v in self.rules.items() if len(k) == 1}
+        multi = {k: v for k, v in self.rules.items() if len(k) > 1}
+        single_chars = set(single)
+
+        self.table = None
+        self.pattern = None
+        if not multi:
+            self.table = str.maketrans(single)
+        elif single and not any(single_chars.intersection(k + v) for k, v in multi.items()):
+            # multi-char keys never overlap the single-char ones and their replacements are not touched by
+            # the table, so substituting them first and translating the rest is equivalent to one regex pass
+            self.table = str.maketrans(single)
+            self.pattern = re.compile("|".join(re.escape(k) for k in multi))
+        else:
+            self.pattern = re.compile("|".join(re.escape(k) for k in self.rules))
+
+    def _sub(self, match):
+        return self.rules[match.group()]
+
+    def __call__(self, text):
+        if self.pattern is not None:
+            text = self.pattern.sub(self._sub, text)
+        if self.table is not None:
+            text = text.translate(self.table)
+        return text
+
+
+_replacers = {}
+
+
+def get_replacer(rules):
+    """``Replacer`` of a rule dict, compiled on first use. Rules must not be mutated afterwards."""
+    entry = _replacers.get(id(rules))
+    if entry is None or entry[0] is not rules:
+        entry = _replacers[id(rules)] = (rules, Replacer(rules))
+    return entry[1]
@@ -0,0 +1,166 @@
+"""ONNX Runtime backend for the BERT frontends.
+
+Every ``*_bert.get_bert_feature`` only consumes ``hidden_states[-3]`` of its masked LM, so the encoder is
+exported truncated to that layer, optionally int8-quantized, and run through onnxruntime on CPU.
+
+The backend is selected by ``text.get_bert`` when it is enabled and the requested device is the CPU::
+
+    MELOPLUS_BERT_BACKEND=onnx MELOPLUS_ONNX_QUANTIZE=1 MELOPLUS_ONNX_THREADS=4 python infer.py ...
+
+or programmatically with ``set_backend("onnx", quantize=True, num_threads=4)``.
+"""
+import os
+
+import numpy as np
+import torch
+from transformers import AutoModelForMaskedLM
+
+from meloplus.download_utils import get_cache_dir
+from meloplus.text.bert_utils import load_tokenizer
+
+BERT_MODEL_IDS = {
+    "ZH": "hfl/chinese-roberta-wwm-ext-large",
+    "EN": "bert-base-uncased",
+    "JP": "tohoku-nlp/bert-base-japanese-v3",
+    "ZH_MIX_EN": "bert-base-multilingual-uncased",
+    "FR": "dbmdz/bert-base-french-europeana-cased",
+    "SP": "dccuchile/bert-base-spanish-wwm-uncased",
+    "ES": "dccuchile/bert-base-spanish-wwm-uncased",
+    "KR": "kykim/bert-kor-base",
+    "TH": "clicknext/phayathaibert",
+    "TR": "ytu-ce-cosmos/turkish-base-bert-uncased",
+}
+# token/word2ph length mismatches are handled like the PyTorch get_bert_feature of each language does
+LENGTH_CHECKS = {"ZH": "none", "ZH_MIX_EN": "none", "TH": "warn"}
+
+# The *_bert modules all take res["hidden_states"][-3:-2]
+HIDDEN_STATE_INDEX = -3
+INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+
+config = {
+    "enabled": os.environ.get("MELOPLUS_BERT_BACKEND", "torch").lower() == "onnx",
+    "quantize": os.environ.get("MELOPLUS_ONNX_QUANTIZE", "0") == "1",
+    "num_threads": int(os.environ.get("MELOPLUS_ONNX_THREADS", "0")),
+}
+
+sessions = {}
+
+
+def set_backend(backend="onnx", quantize=None, num_threads=None):
+    """Switch ``text.get_bert`` between the ``"torch"`` and ``"onnx"`` backends."""
+    if backend not in ("torch", "onnx"):
+        raise ValueError(f"Unknown BERT backend: {backend}")
+    config["enabled"] = backend == "onnx"
+    if quantize is not None:
+        config["quantize"] = quantize
+    if num_threads is not None:
+        config["num_threads"] = num_threads
+    sessions.clear()
+
+
+def is_enabled(device):
+    return config["enabled"] and str(device).startswith("cpu")
+
+
+class TruncatedEncoder(torch.nn.Module):
+    """The base model of a masked LM cut after the layer whose hidden state the frontend uses."""
+
+    def __init__(self, model, hidden_state_index=HIDDEN_STATE_INDEX):
+        super().__init__()
+        self.base = model.base_model
+        num_layers = model.config.num_hidden_layers + 1 + hidden_state_index
+        self.base.encoder.layer = self.base.encoder.layer[:num_layers]
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        outputs = self.base(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)
+        return outputs.last_hidden_state
+
+
+def get_onnx_path(model_id, quantize=False):
+    name = model_id.replace("/", "--") + f".hs{HIDDEN_STATE_INDEX}"
+    if quantize:
+        name += ".int8"
+    return os.path.join(get_cache_dir("onnx"), name + ".onnx")
+
+
+def export_onnx_bert(model_id, output_path=None, opset_version=17):
+    """Export the truncated encoder of ``model_id`` to ONNX, returns the path of the exported model."""
+    output_path = output_path or get_onnx_path(model_id)
+    tokenizer = load_tokenizer(model_id)
+    model = TruncatedEncoder(AutoModelForMaskedLM.from_pretrained(model_id)).eval()
+
+    sample = tokenizer("meloplus", return_tensors="pt")
+    input_names = [name for name in INPUT_NAMES if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["hidden_states"] = {0: "batch", 1: "sequence"}
+
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            tmp_path,
+            input_names=input_names,
+            output_names=["hidden_states"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+        )
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def quantize_onnx_bert(model_id, output_path=None):
+    """Dynamically quantize the exported encoder weights to int8."""
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise ImportError("The ONNX BERT backend requires onnx and onnxruntime.") from e
+
+    fp32_path = get_onnx_path(model_id)
+    if not os.path.exists(fp32_path):
+        export_onnx_bert(model_id, fp32_path)
+    output_path = output_path or get_onnx_path(model_id, quantize=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def get_session(language):
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise ImportError("The ONNX BERT backend requires onnx and onnxruntime.") from e
+
+    model_id = BERT_MODEL_IDS[language]
+    key = (model_id, config["quantize"], config["num_threads"])
+    if key not in sessions:
+        path = get_onnx_path(model_id, quantize=config["quantize"])
+        if not os.path.exists(path):
+            if config["quantize"]:
+                quantize_onnx_bert(model_id, path)
+            else:
+                export_onnx_bert(model_id, path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config["num_threads"] > 0:
+            options.intra_op_num_threads = config["num_threads"]
+        sessions[key] = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    return sessions[key], load_tokenizer(model_id)
+
+
+def get_bert_feature(text, word2ph, language):
+    session, tokenizer = get_session(language)
+    inputs = tokenizer(text, return_tensors="np")
+    feeds = {i.name: inputs[i.name].astype(np.int64) for i in session.get_inputs()}
+    res = torch.from_numpy(session.run(None, feeds)[0][0])
+
+    check = LENGTH_CHECKS.get(language, "assert")
+    n_tokens = inputs["input_ids"].shape[-1]
+    if check == "assert":
+        assert n_tokens == len(word2ph)
+    elif check == "warn" and n_tokens != len(word2ph):
+        print(f"Warning: Mismatch in input lengths. Details: {n_tokens}/{len(word2ph)}")
+    word2phone = torch.LongTensor(word2ph)
+    phone_level_feature = torch.repeat_interleave(res[:len(word2ph)], word2phone, dim=0)
+    return phone_level_feature.T
@@ -2,22 +2,12 @@ import os
 import pickle
 import re
 
-from transformers import AutoTokenizer
-
-from . import symbols
+from . import distribute_phone, symbols
+from .bert_utils import load_tokenizer
 from .es_phonemizer import cleaner as es_cleaner
 from .es_phonemizer import es_to_ipa
 
 
-def distribute_phone(n_phone, n_word):
-    phones_per_word = [0] * n_word
-    for task in range(n_phone):
-        min_tasks = min(phones_per_word)
-        min_index = phones_per_word.index(min_tasks)
-        phones_per_word[min_index] += 1
-    return phones_per_word
-
-
 def text_normalize(text):
     text = es_cleaner.spanish_cleaners(text)
     return text
@@ -67,12 +57,11 @@ def refine_syllables(syllables):
 
 # model_id = 'bert-base-uncased'
 model_id = 'dccuchile/bert-base-spanish-wwm-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
 
 
-def g2p(text, pad_start_end=True, tokenized=None):
+def g2p(text, pad_start_end=True, tokenized=None, batched=False):
     if tokenized is None:
-        tokenized = tokenizer.tokenize(text)
+        tokenized = load_tokenizer(model_id).tokenize(text)
     # import pdb; pdb.set_trace()
     phs = []
     ph_groups = []
@@ -86,14 +75,18 @@ def g2p(text, pad_start_end=True, tokenized=None):
     tones = []
     word2ph = []
     # print(ph_groups)
-    for group in ph_groups:
-        w = "".join(group)
+    words = ["".join(group) for group in ph_groups]
+    if batched:
+        # one gruut pass for the whole sentence instead of one per word
+        word_ipas = iter(es_to_ipa.es2ipa_words([w for w in words if w != '[UNK]']))
+    for group, w in zip(ph_groups, words):
         phone_len = 0
         word_len = len(group)
         if w == '[UNK]':
             phone_list = ['UNK']
         else:
-            phone_list = list(filter(lambda p: p != " ", es_to_ipa.es2ipa(w)))
+            ipa = next(word_ipas) if batched else es_to_ipa.es2ipa(w)
+            phone_list = list(filter(lambda p: p != " ", ipa))
 
         for ph in phone_list:
             phones.append(ph)
@@ -112,7 +105,7 @@ def g2p(text, pad_start_end=True, tokenized=None):
 
 
 def get_bert_feature(text, word2ph, device=None):
-    from text import spanish_bert
+    from . import spanish_bert
     return spanish_bert.get_bert_feature(text, word2ph, device=device)
 
 
@@ -1,21 +1,28 @@
 import sys
 
 import torch
-from transformers import AutoModelForMaskedLM, AutoTokenizer
+from transformers import AutoModelForMaskedLM
+
+from . import bert_utils
 
 model_id = 'dccuchile/bert-base-spanish-wwm-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
 model = None
 
 
-def get_bert_feature(text, word2ph, device=None):
+def get_model(device):
     global model
+    if model is None:
+        model = AutoModelForMaskedLM.from_pretrained(model_id).to(device)
+    return model
+
+
+def get_bert_feature(text, word2ph, device=None):
     if (sys.platform == "darwin" and torch.backends.mps.is_available() and device == "cpu"):
         device = "mps"
     if not device:
         device = "cuda"
-    if model is None:
-        model = AutoModelForMaskedLM.from_pretrained(model_id).to(device)
+    model = get_model(device)
+    tokenizer = bert_utils.load_tokenizer(model_id)
     with torch.no_grad():
         inputs = tokenizer(text, return_tensors="pt")
         for i in inputs:
@@ -33,3 +40,14 @@ def get_bert_feature(text, word2ph, device=None):
     phone_level_feature = torch.cat(phone_level_feature, dim=0)
 
     return phone_level_feature.T
+
+
+def get_bert_feature_batch(texts, word2phs, device=None, batch_size=16):
+    device = bert_utils.resolve_device(device)
+    return bert_utils.phone_level_features(
+        get_model(device),
+        bert_utils.load_tokenizer(model_id),
+        texts,
+        word2phs,
+        device,
+        batch_size=batch_size)
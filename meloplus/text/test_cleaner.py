@@ -0,0 +1,15 @@
+from meloplus.text.cleaner import clean_text, clean_text_batch
+
+TEXTS = [
+    "Did you ever hear a folk tale about a giant turtle?",
+    "The quick brown fox jumps over the lazy dog.",
+    "Hello, world.",
+] * 3
+
+
+def test_clean_text_batch_matches_clean_text():
+    expected = [clean_text(text, "EN") for text in TEXTS]
+    assert clean_text_batch(TEXTS, "EN") == expected
+    assert clean_text_batch(TEXTS, "EN", workers=2, chunksize=2) == expected
+    # the pool is reused across calls
+    assert clean_text_batch(TEXTS[:2], "EN", workers=2) == expected[:2]
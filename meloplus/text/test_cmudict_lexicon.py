@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+from meloplus.text import english
+from meloplus.text.cmudict_lexicon import CmuLexicon, read_cmudict
+from meloplus.text.english import CMU_DICT_PATH, refine_ph, refine_syllables
+
+
+def test_lexicon_matches_cmudict(tmp_path):
+    g2p_dict = read_cmudict(CMU_DICT_PATH)
+    cache_path = str(tmp_path / "cmudict.lex")
+    lexicon = CmuLexicon.load(CMU_DICT_PATH, cache_path, refine=refine_ph)
+    assert os.path.exists(cache_path)
+    assert len(lexicon) == len(g2p_dict)
+
+    # reload through mmap and compare every entry
+    lexicon = CmuLexicon.load(CMU_DICT_PATH, cache_path, refine=refine_ph)
+    for word, syllables in g2p_dict.items():
+        assert lexicon[word] == syllables
+        assert lexicon.refined(word) == refine_syllables(syllables)
+    assert "NOT-A-CMUDICT-WORD" not in lexicon
+    assert lexicon.get("NOT-A-CMUDICT-WORD") is None
+
+
+def test_lexicon_path_falls_back_to_temp_dir(monkeypatch):
+
+    def read_only_cache(*subdirs):
+        raise PermissionError("read-only")
+
+    monkeypatch.setattr(english, "get_cache_dir", read_only_cache)
+    assert os.path.dirname(english.get_lexicon_path()) == tempfile.gettempdir()
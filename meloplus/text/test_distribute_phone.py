@@ -0,0 +1,24 @@
+import pytest
+
+from meloplus.text import distribute_phone
+
+
+def reference_distribute_phone(n_phone, n_word):
+    phones_per_word = [0] * n_word
+    for task in range(n_phone):
+        min_tasks = min(phones_per_word)
+        min_index = phones_per_word.index(min_tasks)
+        phones_per_word[min_index] += 1
+    return phones_per_word
+
+
+def test_distribute_phone_matches_reference():
+    for n_word in range(1, 12):
+        for n_phone in range(0, 40):
+            assert distribute_phone(n_phone, n_word) == reference_distribute_phone(n_phone, n_word)
+
+
+def test_distribute_phone_no_words():
+    assert distribute_phone(0, 0) == []
+    with pytest.raises(ValueError):
+        distribute_phone(3, 0)
@@ -0,0 +1,29 @@
+from meloplus.text import english
+
+
+class CountingG2p:
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, word):
+        self.calls += 1
+        return ["M", "EH1", "L", "OW0"]
+
+
+def test_oov_words_are_memoized_and_persisted(tmp_path, monkeypatch):
+    neural_g2p = CountingG2p()
+    monkeypatch.setattr(english, "_g2p", neural_g2p)
+    english.set_oov_lexicon(str(tmp_path / "oov.tsv"))
+    try:
+        expected = (("m", "eh", "l", "ow"), (0, 2, 0, 1))
+        assert english.word_to_phonemes("meloplusxyz") == expected
+        assert english.word_to_phonemes("meloplusxyz") == expected
+        assert neural_g2p.calls == 1
+
+        # a restart reloads the pronunciation from the OOV lexicon file
+        english.set_oov_lexicon(str(tmp_path / "oov.tsv"))
+        assert english.word_to_phonemes("meloplusxyz") == expected
+        assert neural_g2p.calls == 1
+    finally:
+        english.set_oov_lexicon(None)
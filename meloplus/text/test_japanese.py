@@ -0,0 +1,8 @@
+from meloplus.text.japanese import morpheme_reading
+
+
+def test_morpheme_reading():
+    assert morpheme_reading("東京", "名詞,固有名詞,地域,一般,*,*,トウキョウ,トーキョー") == "トウキョウ"
+    # a morpheme without reading keeps MeCab's "*", as the original text2kata did
+    assert morpheme_reading("ＸＹＺ", "名詞,固有名詞,組織,*,*,*,*") == "*"
+    assert morpheme_reading("っ", "") == "ッ"
@@ -0,0 +1,21 @@
+from meloplus.text import korean
+from meloplus.text.korean import g2p, sentence_group_phonemes, text_normalize
+
+
+def test_g2p_sentence_level():
+    # no phonological rule applies across these word boundaries, so both modes agree
+    text = text_normalize("하늘 바다 사람")
+    phones, _, word2ph = g2p(text, sentence_level=True)
+    assert (phones, word2ph) == g2p(text)[::2]
+
+
+def test_g2p_sentence_level_fallback(monkeypatch):
+    # a g2p whose output no longer lines up with its input once it sees more than one word
+    monkeypatch.setattr(korean, "get_g2p_kr", lambda: lambda text: text.replace(" ", "  "))
+    korean.korean_text_to_phonemes.cache_clear()
+    try:
+        text = text_normalize("하늘 바다 사람")
+        assert sentence_group_phonemes(text, ["하늘", "바다", "사람"]) is None
+        assert g2p(text, sentence_level=True) == g2p(text)
+    finally:
+        korean.korean_text_to_phonemes.cache_clear()
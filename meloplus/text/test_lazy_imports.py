@@ -0,0 +1,43 @@
+import subprocess
+import sys
+
+FRONTENDS = [
+    "chinese", "chinese_mix", "english", "french", "japanese", "korean", "spanish", "thai", "turkish"
+]
+
+# Generous upper bound for importing one frontend on top of the package itself
+FRONTEND_IMPORT_BUDGET = 10.0
+
+
+def _run(code):
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return out.stdout.split()
+
+
+def _loaded_frontends(code):
+    modules = set(_run(code + "\nimport sys\nprint('\\n'.join(sys.modules))"))
+    return {name for name in FRONTENDS if f"meloplus.text.{name}" in modules}
+
+
+def test_cleaner_import_loads_no_frontend():
+    assert _loaded_frontends("import meloplus.text.cleaner") == set()
+
+
+def test_english_frontend_loads_only_english():
+    code = "from meloplus.text.cleaner import get_language_module\nget_language_module('EN')"
+    assert _loaded_frontends(code) == {"english"}
+
+
+def test_frontend_import_time():
+    code = "\n".join([
+        "import time",
+        "t0 = time.perf_counter()",
+        "from meloplus.text.cleaner import get_language_module",
+        "t1 = time.perf_counter()",
+        "get_language_module('EN')",
+        "t2 = time.perf_counter()",
+        "print(t1 - t0, t2 - t1)",
+    ])
+    package_time, english_time = map(float, _run(code))
+    print(f"package import: {package_time:.3f}s, EN frontend import: {english_time:.3f}s")
+    assert english_time < FRONTEND_IMPORT_BUDGET
@@ -0,0 +1,49 @@
+import re
+import timeit
+
+from meloplus.text import cleaner_multiling
+from meloplus.text.normalization import Replacer
+
+
+def reference_replace(rules, text):
+    pattern = re.compile("|".join(re.escape(p) for p in rules.keys()))
+    return pattern.sub(lambda x: rules[x.group()], text)
+
+
+TEXTS = [
+    "Hello… world... (really)？ “Yes”！【ok】～fine；done：",
+    "1+1 and 2+1, 1+1+1",
+    "a...b...c....d",
+    "",
+]
+
+
+def test_replacer_matches_regex_substitution():
+    rule_sets = [
+        cleaner_multiling.rep_map,  # translate table + multi-char regex
+        {
+            "a": "b",
+            "b": "c"
+        },  # translate only, replacements are not rescanned
+        {
+            "1+1": "x",
+            "2+1": "y"
+        },  # multi-char keys only
+        {
+            ".": "!",
+            "...": "…"
+        },  # overlapping keys, falls back to one combined regex
+    ]
+    for rules in rule_sets:
+        replacer = Replacer(rules)
+        for text in TEXTS:
+            assert replacer(text) == reference_replace(rules, text), (rules, text)
+
+
+def test_replacer_benchmark():
+    text = TEXTS[0] * 4
+    replacer = Replacer(cleaner_multiling.rep_map)
+    compiled = timeit.timeit(lambda: replacer(text), number=2000)
+    per_call = timeit.timeit(lambda: reference_replace(cleaner_multiling.rep_map, text), number=2000)
+    print(f"compiled replacer: {compiled * 500:.3f}us/call, per-call regex: {per_call * 500:.3f}us/call")
+    assert compiled < per_call
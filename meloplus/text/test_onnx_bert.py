@@ -0,0 +1,39 @@
+import pytest
+import torch
+
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from meloplus.text import get_bert, onnx_bert
+from meloplus.text.english import g2p, text_normalize
+
+
+@pytest.fixture
+def english_input():
+    text = text_normalize("Did you ever hear a folk tale about a giant turtle?")
+    phones, tones, word2ph = g2p(text)
+    return text, word2ph
+
+
+@pytest.fixture(autouse=True)
+def restore_backend():
+    saved = dict(onnx_bert.config)
+    yield
+    onnx_bert.config.update(saved)
+    onnx_bert.sessions.clear()
+
+
+def _features(text, word2ph, backend, quantize=False):
+    onnx_bert.set_backend(backend, quantize=quantize, num_threads=2)
+    return get_bert(text, list(word2ph), "EN", "cpu")
+
+
+@pytest.mark.parametrize("quantize,min_similarity", [(False, 0.999), (True, 0.95)])
+def test_onnx_bert_parity(english_input, quantize, min_similarity):
+    text, word2ph = english_input
+    reference = _features(text, word2ph, "torch")
+    features = _features(text, word2ph, "onnx", quantize=quantize)
+
+    assert features.shape == reference.shape
+    similarity = torch.nn.functional.cosine_similarity(features, reference, dim=0)
+    assert similarity.min().item() > min_similarity, f"cosine similarity {similarity.min().item()}"
@@ -112,6 +112,11 @@ def test_g2p():
     assert word2ph == expected_word2ph
 
 
+def test_g2p_sentence_level():
+    text = text_normalize("ฉันเข้าใจคุณค่าของงาน กงล้อ")
+    assert g2p(text, sentence_level=True) == g2p(text)
+
+
 def test_get_bert_feature_thai():
     text = "กงล้อ"
     normalized_text = text_normalize(text)
@@ -1,15 +1,17 @@
 # https://github.com/myshell-ai/MeloTTS/pull/117
 
+import functools
 import re
 import unicodedata
-from transformers import AutoTokenizer
-from . import punctuation, symbols, pu_symbols
+from . import distribute_phone, punctuation, symbols, pu_symbols
+from .bert_utils import load_tokenizer
 from num2words import num2words
 from pythainlp.tokenize import word_tokenize
 from pythainlp.transliterate import romanize
 from pythainlp.util import normalize as thai_normalize
 from pythainlp.util import thai_to_eng, eng_to_thai
 from meloplus.text.thai_dictionary import english_dictionary, etc_dictionary
+from .normalization import get_replacer
 from collections import defaultdict
 import logging
 import os
@@ -19,10 +21,7 @@ logger = logging.getLogger(__name__)
 
 
 def normalize_with_dictionary(text, dic):
-    if any(key in text for key in dic.keys()):
-        pattern = re.compile("|".join(re.escape(key) for key in dic.keys()))
-        return pattern.sub(lambda x: dic[x.group()], text)
-    return text
+    return get_replacer(dic)(text)
 
 
 def normalize(text):
@@ -57,7 +56,40 @@ with open(dict_path, encoding="utf-8") as f:
         thai_g2p_dict[word].append(phonemes.split())
         thai_g2p_dict["ะ"] = ["a"]
 
-
+# Trie over the dictionary keys for longest-prefix matching, built on first use
+g2p_trie = None
+_TRIE_END = None
+
+
+def get_g2p_trie():
+    global g2p_trie
+    if g2p_trie is None:
+        trie = {}
+        for key, phonemes_list in thai_g2p_dict.items():
+            if not key or not phonemes_list:
+                continue
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[_TRIE_END] = " ".join(phonemes_list[0])
+        g2p_trie = trie
+    return g2p_trie
+
+
+def longest_prefix(word, start=0):
+    """End index and phonemes of the longest dictionary key that is a prefix of ``word[start:]``."""
+    node = get_g2p_trie()
+    match = None
+    for i in range(start, len(word)):
+        node = node.get(word[i])
+        if node is None:
+            break
+        if _TRIE_END in node:
+            match = (i + 1, node[_TRIE_END])
+    return match
+
+
+@functools.lru_cache(maxsize=65536)
 def map_word_to_phonemes(word):
     logger.debug(f"Looking up word: {word}")
 
@@ -80,32 +112,32 @@ def map_word_to_phonemes(word):
 
 
 def map_partial_word(word):
-    if not word:
-        return ""
-
     logger.debug(f"Mapping partial word: {word}")
+    pieces = []
+    i = 0
+    while i < len(word):
+        # Handle Thanthakhat (์) character
+        if i + 1 < len(word) and word[i + 1] == '์':
+            i += 2
+            continue
 
-    # Handle Thanthakhat (์) character
-    if len(word) > 1 and word[1] == '์':
-        logger.debug(f"Found Thanthakhat, skipping {word[:2]}")
-        return map_partial_word(word[2:])
-
-    # Handle vowels and tone marks
-    if word[0] in thai_vowels or word[0] in thai_tone_marks:
-        phoneme = thai_g2p_dict.get(word[0], [word[0]])[0]
-        return phoneme + " " + map_partial_word(word[1:])
+        # Handle vowels and tone marks
+        if word[i] in thai_vowels or word[i] in thai_tone_marks:
+            pieces.append(thai_g2p_dict.get(word[i], [word[i]])[0])
+            i += 1
+            continue
 
-    # Try to find the longest matching prefix
-    for i in range(len(word), 0, -1):
-        prefix = word[:i]
-        phonemes_list = thai_g2p_dict.get(prefix)
-        if phonemes_list:
-            logger.debug(f"Found matching prefix: {prefix}")
-            return " ".join(phonemes_list[0]) + " " + map_partial_word(word[i:])
+        # Try to find the longest matching prefix
+        match = longest_prefix(word, i)
+        if match is not None:
+            i, phonemes = match
+            pieces.append(phonemes)
+            continue
 
-    # If no match found, return the first character and continue with the rest
-    logger.debug(f"No match found for {word[0]}, continuing with rest")
-    return word[0] + " " + map_partial_word(word[1:])
+        # If no match found, keep the character and continue with the rest
+        pieces.append(word[i])
+        i += 1
+    return "".join(piece + " " for piece in pieces)
 
 
 # Comprehensive mapping of Thai characters to their phonetic representations
@@ -196,10 +228,7 @@ def map_remaining_thai_chars(phones):
     return mapped_phones
 
 
-def thai_text_to_phonemes(text):
-    text = normalize(text)
-    words = word_tokenize(text, engine="newmm")
-    logger.debug(f"word_tokenize output: {words}")
+def thai_words_to_phonemes(words):
     phonemes = []
     for word in words:
         word_phonemes = map_word_to_phonemes(word)
@@ -211,6 +240,34 @@ def thai_text_to_phonemes(text):
     return " ".join(mapped_phonemes)
 
 
+def thai_text_to_phonemes(text):
+    text = normalize(text)
+    words = word_tokenize(text, engine="newmm")
+    logger.debug(f"word_tokenize output: {words}")
+    return thai_words_to_phonemes(words)
+
+
+def tokenize_groups(texts):
+    """newmm words of every text from a single ``word_tokenize`` call over all of them.
+
+    Returns None when the words cannot be aligned back to the texts, e.g. if a text contains a space.
+    """
+    normalized = [normalize(text) for text in texts]
+    if not normalized or any(not text or " " in text for text in normalized):
+        return None
+    groups = [[]]
+    for word in word_tokenize(" ".join(normalized), engine="newmm"):
+        if word == " ":
+            groups.append([])
+        elif " " in word:
+            return None
+        else:
+            groups[-1].append(word)
+    if len(groups) != len(texts) or any("".join(words) != text for words, text in zip(groups, normalized)):
+        return None
+    return groups
+
+
 # Define Thai vowels, tone marks, and special characters
 thai_vowels = set("ะัาำิีึืุูเแโใไฤฦ็")
 thai_tone_marks = set("่้๊๋")
@@ -243,17 +300,7 @@ def text_normalize(text):
     return text
 
 
-def distribute_phone(n_phone, n_word):
-    phones_per_word = [0] * n_word
-    for task in range(n_phone):
-        min_tasks = min(phones_per_word)
-        min_index = phones_per_word.index(min_tasks)
-        phones_per_word[min_index] += 1
-    return phones_per_word
-
-
 model_id = 'clicknext/phayathaibert'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
 
 tone_map = {
     "˧": 2,  # Mid tone
@@ -300,8 +347,30 @@ def extract_tones(phs):
     return phonemes, tones
 
 
+def _phonemes_and_tones(phonemes):
+    word_phonemes = []
+    word_tones = []
+    for p_group in filter(str.strip, phonemes.split(".")):
+        group_phonemes, group_tones = extract_tones(p_group)
+        word_phonemes.extend(group_phonemes)
+        word_tones.extend(group_tones)
+    return tuple(word_phonemes), tuple(word_tones)
+
+
+@functools.lru_cache(maxsize=65536)
+def word_phonemes_and_tones(text):
+    """Phonemes and tones of one tokenizer word group, memoized."""
+    return _phonemes_and_tones(thai_text_to_phonemes(text))
+
+
+@functools.lru_cache(maxsize=65536)
+def words_phonemes_and_tones(words):
+    """Same as ``word_phonemes_and_tones`` for a group already split into newmm words."""
+    return _phonemes_and_tones(thai_words_to_phonemes(words))
+
+
 # def g2p_bert(norm_text, pad_start_end=True):
-#     tokenized = tokenizer.tokenize(norm_text)
+#     tokenized = load_tokenizer(model_id).tokenize(norm_text)
 #     print("tokenized text")
 #     phs = []
 #     tones = []
@@ -351,7 +420,7 @@ def extract_tones(phs):
 
 
 def g2p_og(norm_text, pad_start_end=True):
-    tokenized = tokenizer.tokenize(norm_text)
+    tokenized = load_tokenizer(model_id).tokenize(norm_text)
     phs = []
     tones = []
     word2ph = []
@@ -400,7 +469,7 @@ def g2p_og(norm_text, pad_start_end=True):
 
 
 def g2p_no_undersscores(norm_text, pad_start_end=True):
-    tokenized = tokenizer.tokenize(norm_text)
+    tokenized = load_tokenizer(model_id).tokenize(norm_text)
     # print("The tokenized text", tokenized)
     phs = []
     tones = []
@@ -465,8 +534,11 @@ def g2p_no_undersscores(norm_text, pad_start_end=True):
     return phs, tones, word2ph
 
 
-def g2p(norm_text, pad_start_end=True):
-    tokenized = tokenizer.tokenize(norm_text)
+def g2p(norm_text, pad_start_end=True, sentence_level=False):
+    """With ``sentence_level=True`` the word groups are split into newmm words by a single tokenization of
+    the sentence (falling back to one tokenization per group when that cannot be aligned). newmm may split
+    a group differently in context, so this is opt-in."""
+    tokenized = load_tokenizer(model_id).tokenize(norm_text)
     phs = []
     tones = []
     ph_groups = []
@@ -481,6 +553,14 @@ def g2p(norm_text, pad_start_end=True):
             else:
                 ph_groups[-1].append(t)
 
+    group_words = None
+    if sentence_level:
+        texts = ["".join(group) for group in ph_groups]
+        words = tokenize_groups(
+            [text for text in texts if text not in ('▁', '[UNK]') and text not in punctuation])
+        if words is not None:
+            group_words = iter(words)
+
     word2ph = []
     for group in ph_groups:
         text = "".join(group)
@@ -501,16 +581,10 @@ def g2p(norm_text, pad_start_end=True):
             continue
 
         # Phoneme conversion for grouped text
-        phonemes = thai_text_to_phonemes(text)
-        phoneme_groups = phonemes.split(".")
-        phoneme_groups = list(filter(str.strip, phoneme_groups))
-
-        word_phonemes = []
-        word_tones = []
-        for p_group in phoneme_groups:
-            group_phonemes, group_tones = extract_tones(p_group)
-            word_phonemes.extend(group_phonemes)
-            word_tones.extend(group_tones)
+        if group_words is not None:
+            word_phonemes, word_tones = words_phonemes_and_tones(tuple(next(group_words)))
+        else:
+            word_phonemes, word_tones = word_phonemes_and_tones(text)
 
         phone_len = len(word_phonemes)
         word_len = len(group)
@@ -536,6 +610,12 @@ def get_bert_feature(text, word2ph, device='cuda', model_id='clicknext/phayathai
     return thai_bert.get_bert_feature(text, word2ph, device=device, model_id=model_id)
 
 
+def get_bert_feature_batch(texts, word2phs, device='cuda', model_id='clicknext/phayathaibert', batch_size=16):
+    from . import thai_bert
+    return thai_bert.get_bert_feature_batch(
+        texts, word2phs, device=device, model_id=model_id, batch_size=batch_size)
+
+
 if __name__ == "__main__":
     try:
         from text.symbols import symbols
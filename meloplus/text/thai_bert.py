@@ -1,28 +1,26 @@
 # https://github.com/myshell-ai/MeloTTS/pull/117
 import torch
-from transformers import AutoTokenizer, AutoModelForMaskedLM
+from transformers import AutoModelForMaskedLM
 import sys
 
+from . import bert_utils
+
 models = {}
-tokenizers = {}
 
 
-def get_bert_feature(text, word2ph, device=None, model_id='clicknext/phayathaibert'):
-    global model
-    global tokenizer
+def get_model(device, model_id='clicknext/phayathaibert'):
+    if model_id not in models:
+        models[model_id] = AutoModelForMaskedLM.from_pretrained(model_id).to(device)
+    return models[model_id]
+
 
+def get_bert_feature(text, word2ph, device=None, model_id='clicknext/phayathaibert'):
     if (sys.platform == "darwin" and torch.backends.mps.is_available() and device == "cpu"):
         device = "mps"
     if not device:
         device = "cuda"
-    if model_id not in models:
-        model = AutoModelForMaskedLM.from_pretrained(model_id).to(device)
-        models[model_id] = model
-        tokenizer = AutoTokenizer.from_pretrained(model_id)
-        tokenizers[model_id] = tokenizer
-    else:
-        model = models[model_id]
-        tokenizer = tokenizers[model_id]
+    model = get_model(device, model_id)
+    tokenizer = bert_utils.load_tokenizer(model_id)
 
     with torch.no_grad():
         inputs = tokenizer(text, return_tensors="pt")
@@ -48,3 +46,22 @@ def get_bert_feature(text, word2ph, device=None, model_id='clicknext/phayathaibe
     phone_level_feature = torch.cat(phone_level_feature, dim=0)
 
     return phone_level_feature.T
+
+
+def get_bert_feature_batch(
+    texts,
+    word2phs,
+    device=None,
+    model_id='clicknext/phayathaibert',
+    batch_size=16,
+):
+    device = bert_utils.resolve_device(device)
+    # like get_bert_feature, a token/word2ph mismatch is only reported for Thai
+    return bert_utils.phone_level_features(
+        get_model(device, model_id),
+        bert_utils.load_tokenizer(model_id),
+        texts,
+        word2phs,
+        device,
+        batch_size=batch_size,
+        strict=False)
@@ -1,17 +1,8 @@
 # https://github.com/g-hano/MeloTTS/blob/main/melo/text/turkish.py
 
 import re
-from transformers import AutoTokenizer
-from . import symbols
-
-
-def distribute_phone(n_phone, n_word):
-    phones_per_word = [0] * n_word
-    for task in range(n_phone):
-        min_tasks = min(phones_per_word)
-        min_index = phones_per_word.index(min_tasks)
-        phones_per_word[min_index] += 1
-    return phones_per_word
+from . import distribute_phone, symbols
+from .bert_utils import load_tokenizer
 
 
 def text_normalize(text):
@@ -56,53 +47,55 @@ def refine_ph(phn):
     return phn.lower(), tone
 
 
+tr_to_ipa_dict = {
+    'a': 'a',
+    'e': 'e',
+    'ı': 'ɯ',
+    'i': 'i',
+    'o': 'o',
+    'ö': 'ø',
+    'u': 'u',
+    'ü': 'y',
+    'b': 'b',
+    'c': 'dʒ',
+    'ç': 'tʃ',
+    'd': 'd',
+    'f': 'f',
+    'g': 'ɡ',
+    'ğ': 'ː',
+    'h': 'h',
+    'j': 'ʒ',
+    'k': 'k',
+    'l': 'l',
+    'm': 'm',
+    'n': 'n',
+    'p': 'p',
+    'r': 'r',
+    's': 's',
+    'ş': 'ʃ',
+    't': 't',
+    'v': 'v',
+    'y': 'j',
+    'z': 'z'
+}
+tr_to_ipa_table = str.maketrans(tr_to_ipa_dict)
+
+
 def tr_to_ipa(text):
     """
     Convert Turkish text to IPA
     This is a basic implementation - you might want to expand this based on Turkish phonology rules
     """
-    tr_to_ipa_dict = {
-        'a': 'a',
-        'e': 'e',
-        'ı': 'ɯ',
-        'i': 'i',
-        'o': 'o',
-        'ö': 'ø',
-        'u': 'u',
-        'ü': 'y',
-        'b': 'b',
-        'c': 'dʒ',
-        'ç': 'tʃ',
-        'd': 'd',
-        'f': 'f',
-        'g': 'ɡ',
-        'ğ': 'ː',
-        'h': 'h',
-        'j': 'ʒ',
-        'k': 'k',
-        'l': 'l',
-        'm': 'm',
-        'n': 'n',
-        'p': 'p',
-        'r': 'r',
-        's': 's',
-        'ş': 'ʃ',
-        't': 't',
-        'v': 'v',
-        'y': 'j',
-        'z': 'z'
-    }
-    return ''.join(tr_to_ipa_dict.get(char, char) for char in text.lower())
+    return text.lower().translate(tr_to_ipa_table)
 
 
 # Initialize the Turkish BERT tokenizer
 model_id = 'ytu-ce-cosmos/turkish-base-bert-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_id)
 
 
 def g2p(text, pad_start_end=True, tokenized=None):
     if tokenized is None:
-        tokenized = tokenizer.tokenize(text)
+        tokenized = load_tokenizer(model_id).tokenize(text)
 
     phs = []
     ph_groups = []
@@ -140,7 +133,7 @@ def g2p(text, pad_start_end=True, tokenized=None):
 
 
 def get_bert_feature(text, word2ph, device=None):
-    from text import turkish_bert
+    from . import turkish_bert
     return turkish_bert.get_bert_feature(text, word2ph, device=device)
 
 
@@ -16,6 +16,7 @@ from huggingface_hub import HfApi
 logging.getLogger("numba").setLevel(logging.WARNING)
 import commons
 import utils
+from data_shards import ShardedTextAudioSpeakerLoader
 from data_utils import DistributedBucketSampler, TextAudioSpeakerCollate, TextAudioSpeakerLoader
 from losses import discriminator_loss, feature_loss, generator_loss, kl_loss
 from mel_processing import mel_spectrogram_torch, spec_to_mel_torch
@@ -59,16 +60,28 @@ def run():
         utils.check_git_hash(hps.model_dir)
         writer = SummaryWriter(log_dir=hps.model_dir)
         writer_eval = SummaryWriter(log_dir=os.path.join(hps.model_dir, "eval"))
-    train_dataset = TextAudioSpeakerLoader(hps.data.training_files, hps.data)
+    if getattr(hps.data, "training_shards", None):
+        # packed with `python data_shards.py`, memory-mapped instead of reading wav/bert/spec files per item
+        train_dataset = ShardedTextAudioSpeakerLoader(hps.data.training_shards, hps.data)
+    else:
+        train_dataset = TextAudioSpeakerLoader(hps.data.training_files, hps.data)
+    # train.max_frames switches to frame-budget batches, with boundaries from length quantiles
+    # unless data.bucket_boundaries is set
+    max_frames = getattr(hps.train, "max_frames", None)
+    boundaries = getattr(hps.data, "bucket_boundaries", None)
+    if boundaries is None and not max_frames:
+        boundaries = [32, 300, 400, 500, 600, 700, 800, 900, 1000]
     train_sampler = DistributedBucketSampler(
         train_dataset,
         hps.train.batch_size,
-        [32, 300, 400, 500, 600, 700, 800, 900, 1000],
+        boundaries,
         num_replicas=n_gpus,
         rank=rank,
         shuffle=True,
+        max_frames=max_frames,
+        num_buckets=getattr(hps.train, "num_buckets", 8),
     )
-    collate_fn = TextAudioSpeakerCollate()
+    collate_fn = TextAudioSpeakerCollate(max_wav_value=hps.data.max_wav_value)
     train_loader = DataLoader(
         train_dataset,
         num_workers=16,
@@ -288,8 +301,11 @@ def train_and_evaluate(rank, epoch, hps, nets, optims, schedulers, scaler, loade
         speakers = speakers.cuda(rank, non_blocking=True)
         tone = tone.cuda(rank, non_blocking=True)
         language = language.cuda(rank, non_blocking=True)
-        bert = bert.cuda(rank, non_blocking=True)
-        ja_bert = ja_bert.cuda(rank, non_blocking=True)
+        # the collate function leaves out BERT streams that no item of the batch uses
+        if bert is not None:
+            bert = bert.cuda(rank, non_blocking=True)
+        if ja_bert is not None:
+            ja_bert = ja_bert.cuda(rank, non_blocking=True)
 
         with autocast(enabled=hps.train.fp16_run):
             (
@@ -353,13 +369,14 @@ def train_and_evaluate(rank, epoch, hps, nets, optims, schedulers, scaler, loade
                 optim_dur_disc.zero_grad()
                 scaler.scale(loss_dur_disc_all).backward()
                 scaler.unscale_(optim_dur_disc)
-                commons.clip_grad_value_(net_dur_disc.parameters(), None)
+                commons.clip_grad_value_(net_dur_disc.parameters(), None, as_tensor=True)
                 scaler.step(optim_dur_disc)
 
         optim_d.zero_grad()
         scaler.scale(loss_disc_all).backward()
         scaler.unscale_(optim_d)
-        grad_norm_d = commons.clip_grad_value_(net_d.parameters(), None)
+        # grad norms stay on the device and are only read when logging
+        grad_norm_d = commons.clip_grad_value_(net_d.parameters(), None, as_tensor=True)
         scaler.step(optim_d)
 
         with autocast(enabled=hps.train.fp16_run):
@@ -381,7 +398,7 @@ def train_and_evaluate(rank, epoch, hps, nets, optims, schedulers, scaler, loade
         optim_g.zero_grad()
         scaler.scale(loss_gen_all).backward()
         scaler.unscale_(optim_g)
-        grad_norm_g = commons.clip_grad_value_(net_g.parameters(), None)
+        grad_norm_g = commons.clip_grad_value_(net_g.parameters(), None, as_tensor=True)
 
         scaler.step(optim_g)
         scaler.update()
@@ -397,8 +414,8 @@ def train_and_evaluate(rank, epoch, hps, nets, optims, schedulers, scaler, loade
                     "loss/g/total": loss_gen_all,
                     "loss/d/total": loss_disc_all,
                     "learning_rate": lr,
-                    "grad_norm_d": grad_norm_d,
-                    "grad_norm_g": grad_norm_g,
+                    "grad_norm_d": grad_norm_d.item(),
+                    "grad_norm_g": grad_norm_g.item(),
                 }
                 scalar_dict.update({
                     "loss/g/fm": loss_fm,
@@ -506,8 +523,8 @@ def evaluate(hps, generator, eval_loader, writer_eval):
             spec, spec_lengths = spec.cuda(), spec_lengths.cuda()
             y, y_lengths = y.cuda(), y_lengths.cuda()
             speakers = speakers.cuda()
-            bert = bert.cuda()
-            ja_bert = ja_bert.cuda()
+            bert = bert.cuda() if bert is not None else None
+            ja_bert = ja_bert.cuda() if ja_bert is not None else None
             tone = tone.cuda()
             language = language.cuda()
             for use_sdp in [True, False]:
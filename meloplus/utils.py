@@ -3,6 +3,7 @@ import glob
 import json
 import logging
 import os
+import struct
 import subprocess
 
 import librosa
@@ -12,7 +13,8 @@ import torchaudio
 from scipy.io.wavfile import read
 
 from meloplus import commons
-from meloplus.text import cleaned_text_to_sequence, get_bert
+from meloplus.text import (
+    _symbol_to_id, get_bert, language_id_map, language_tone_start_map, num_tones, split_bert_streams)
 from meloplus.text.cleaner import clean_text
 
 MATPLOTLIB_FLAG = False
@@ -22,38 +24,64 @@ logger = logging.getLogger(__name__)
 
 def get_text_for_tts_infer(text, language_str, hps, device, symbol_to_id=None):
     norm_text, phone, tone, word2ph = clean_text(text, language_str)
-    phone, tone, language = cleaned_text_to_sequence(phone, tone, language_str, symbol_to_id)
+    return get_text_from_phonemes(
+        phone, tone, word2ph, language_str, hps, device, symbol_to_id, norm_text=norm_text)
+
+
+def get_text_from_phonemes(
+    phones,
+    tones,
+    word2ph,
+    language_str,
+    hps,
+    device,
+    symbol_to_id=None,
+    bert=None,
+    ja_bert=None,
+    norm_text=None,
+):
+    """Model inputs from a precomputed frontend result, i.e. the ``phones, tones, word2ph`` of ``clean_text``.
 
+    ``bert``/``ja_bert`` must already be aligned to the model sequence (blanks included); a missing stream is
+    None, which the model reads as zero features. When neither is given, the language's stream is computed
+    from ``norm_text`` unless BERT is disabled or ``norm_text`` is missing.
+    """
+    symbol_to_id = symbol_to_id if symbol_to_id else _symbol_to_id
+    unknown = sorted(set(phones).difference(symbol_to_id))
+    if unknown:
+        raise ValueError(f"Unknown phone symbols for this model: {unknown}")
+    if len(tones) != len(phones) or sum(word2ph) != len(phones):
+        raise ValueError(
+            f"Mismatched frontend output: {len(phones)} phones, {len(tones)} tones, "
+            f"word2ph sums to {sum(word2ph)}")
+    tone_start = language_tone_start_map[language_str]
+    tone = torch.LongTensor(tones) + tone_start
+    if len(tones) and (tone.min() < tone_start or tone.max() >= getattr(hps, "num_tones", num_tones)):
+        raise ValueError(f"Tones out of range for {language_str}: {sorted(set(tones))}")
+
+    phone = torch.LongTensor([symbol_to_id[s] for s in phones])
+    language = torch.full_like(phone, language_id_map[language_str])
+    word2ph = list(word2ph)
     if hps.data.add_blank:
-        phone = commons.intersperse(phone, 0)
-        tone = commons.intersperse(tone, 0)
-        language = commons.intersperse(language, 0)
-        for i in range(len(word2ph)):
-            word2ph[i] = word2ph[i] * 2
+        phone = commons.intersperse_tensor(phone, 0)
+        tone = commons.intersperse_tensor(tone, 0)
+        language = commons.intersperse_tensor(language, 0)
+        word2ph = [n * 2 for n in word2ph]
         word2ph[0] += 1
 
-    if getattr(hps.data, "disable_bert", False):
-        bert = torch.zeros(1024, len(phone))
-        ja_bert = torch.zeros(768, len(phone))
+    n = phone.size(0)
+    if bert is None and ja_bert is None:
+        if not getattr(hps.data, "disable_bert", False) and norm_text is not None:
+            features = get_bert(norm_text, word2ph, language_str, device)
+            assert features.shape[-1] == n, phones
+            bert, ja_bert = split_bert_streams(features, language_str)
     else:
-        bert = get_bert(norm_text, word2ph, language_str, device)
-        del word2ph
-        assert bert.shape[-1] == len(phone), phone
-
-        if language_str == "ZH":
-            bert = bert
-            ja_bert = torch.zeros(768, len(phone))
-        elif language_str in ["JP", "EN", "ZH_MIX_EN", 'KR', 'SP', 'ES', 'FR', 'DE', 'RU', 'TH', 'TR']:
-            ja_bert = bert
-            bert = torch.zeros(1024, len(phone))
-        else:
-            raise NotImplementedError()
-
-    assert bert.shape[-1] == len(phone), f"Bert seq len {bert.shape[-1]} != {len(phone)}"
-
-    phone = torch.LongTensor(phone)
-    tone = torch.LongTensor(tone)
-    language = torch.LongTensor(language)
+        bert = None if bert is None else torch.as_tensor(bert).float()
+        ja_bert = None if ja_bert is None else torch.as_tensor(ja_bert).float()
+
+    for feats in [bert, ja_bert]:
+        if feats is not None and feats.shape[-1] != n:
+            raise ValueError(f"Bert seq len {feats.shape[-1]} != {n}")
     return bert, ja_bert, phone, tone, language
 
 
@@ -225,6 +253,134 @@ def load_wav_to_torch_librosa(full_path, sr):
     return torch.FloatTensor(audio_norm.astype(np.float32)), sampling_rate
 
 
+def read_wav_header(full_path):
+    """``(format_tag, channels, sampling_rate, bits, data_offset, data_size)`` of a RIFF/WAVE file, or None
+    when the file is not a plain wav (e.g. RF64 or a truncated header)."""
+    with open(full_path, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt ":
+                data = f.read(chunk_size)
+                format_tag, channels, sampling_rate, _, _, bits = struct.unpack("<HHIIHH", data[:16])
+                if format_tag == 0xFFFE and len(data) >= 26:
+                    # WAVE_FORMAT_EXTENSIBLE: the real format is the first field of the sub-format GUID
+                    format_tag = struct.unpack("<H", data[24:26])[0]
+                fmt = (format_tag, channels, sampling_rate, bits)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    return None
+                data_size = min(chunk_size, os.path.getsize(full_path) - f.tell())
+                return fmt + (f.tell(), data_size)
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+
+# (format tag, bits) -> (dtype, scale) of PCM layouts that can be mapped directly
+WAV_DTYPES = {(1, 16): (np.int16, 1. / 32768), (3, 32): (np.float32, 1.)}
+
+
+def load_wav_to_torch_fast(full_path, sr):
+    """Same result as ``load_wav_to_torch_librosa``, without librosa when the file is already at ``sr``.
+
+    16-bit PCM and float32 wavs are memory-mapped and converted to float32 in one pass; other formats are
+    decoded with soundfile. Files at another sampling rate still go through librosa to be resampled.
+    """
+    header = read_wav_header(full_path)
+    if header is not None:
+        format_tag, channels, sampling_rate, bits, offset, size = header
+        layout = WAV_DTYPES.get((format_tag, bits))
+        if sampling_rate == sr and layout is not None:
+            dtype, scale = layout
+            frames = size // (np.dtype(dtype).itemsize * channels)
+            data = np.memmap(full_path, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+            audio = data.mean(axis=1, dtype=np.float32) if channels > 1 else data[:, 0].astype(np.float32)
+            if scale != 1.:
+                audio *= scale
+            return torch.from_numpy(audio), sampling_rate
+    import soundfile
+    try:
+        info = soundfile.info(full_path)
+    except RuntimeError:
+        info = None
+    if info is not None and info.samplerate == sr:
+        audio, sampling_rate = soundfile.read(full_path, dtype="float32", always_2d=True)
+        return torch.from_numpy(audio.mean(axis=1, dtype=np.float32)), sampling_rate
+    return load_wav_to_torch_librosa(full_path, sr)
+
+
+def audio_num_samples(full_path, sr):
+    """Number of samples of ``full_path`` once loaded at ``sr``, read from the file header only."""
+    header = read_wav_header(full_path)
+    if header is not None and header[1] > 0 and header[3] > 0:
+        _, channels, sampling_rate, bits, _, size = header
+        frames = size // (channels * ((bits + 7) // 8))
+    else:
+        import soundfile
+        info = soundfile.info(full_path)
+        frames, sampling_rate = info.frames, info.samplerate
+    # resampling rounds the length up
+    return -(-frames * sr // sampling_rate)
+
+
+LENGTH_INDEX_VERSION = 1
+
+
+def length_index_path(filelist):
+    return f"{filelist}.lengths.json"
+
+
+def load_length_index(filelist, audiopaths, sampling_rate, hop_length, check_files=False, workers=16):
+    """Spectrogram lengths of ``audiopaths`` (listed in ``filelist``), cached next to the filelist.
+
+    While the filelist is unchanged the cached lengths are used without touching the audio files, unless
+    ``check_files`` is set. Otherwise every file is stat'ed and only those whose size or mtime changed have
+    their header read again.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    path = length_index_path(filelist)
+    signature = {"version": LENGTH_INDEX_VERSION, "sampling_rate": sampling_rate, "hop_length": hop_length}
+    stat = os.stat(filelist)
+    filelist_key = [stat.st_size, stat.st_mtime_ns]
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    if index.get("signature") != signature:
+        index = {}
+    entries = index.get("entries", {})
+    if not check_files and index.get("filelist") == filelist_key and all(p in entries for p in audiopaths):
+        return [entries[p][2] for p in audiopaths]
+
+    def entry(audiopath):
+        stat = os.stat(audiopath)
+        old = entries.get(audiopath)
+        if old is not None and old[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return old
+        return [stat.st_size, stat.st_mtime_ns, audio_num_samples(audiopath, sampling_rate) // hop_length]
+
+    unique = list(dict.fromkeys(audiopaths))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        entries = dict(zip(unique, pool.map(entry, unique)))
+    index = {"signature": signature, "filelist": filelist_key, "entries": entries}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write the length index {path}: {e}")
+    return [entries[p][2] for p in audiopaths]
+
+
 def load_filepaths_and_text(filename, split="|"):
     with open(filename, encoding="utf-8") as f:
         filepaths_and_text = [line.strip().split(split) for line in f]
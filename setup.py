@@ -52,13 +52,10 @@ setuptools.setup(
     install_requires=INSTALL_REQUIRES,
     packages=setuptools.find_packages(),
     package_data={
-        'meloplus.text': [
-            'opencpop-strict.txt', 'cmudict.rep', 'cmudict_cache.pickle', '*.txt', '*.rep', '*.dict',
-            '*.pickle'
-        ],
+        'meloplus.text':
+        ['opencpop-strict.txt', 'cmudict.rep', '*.txt', '*.tsv', '*.rep', '*.dict', '*.pickle'],
         'meloplus.text.fr_phonemizer': ['*.txt'],
         'meloplus.text.es_phonemizer': ['*.txt'],
-        'meloplus.text': ['*.tsv', '*.txt'],
     },
     include_package_data=True,
 )
@@ -0,0 +1,25 @@
+import torch
+
+from meloplus.artifacts import read_shard, write_shard
+from meloplus.text import symbols
+from meloplus.utils import HParams, get_text_from_phonemes
+
+
+def test_shard_round_trip(tmp_path):
+    hps = HParams(data={"add_blank": True}, symbols=symbols)
+    phones, tones, word2ph = ["_", "h", "ah", "l", "ow", "_"], [0, 0, 2, 0, 1, 0], [1, 4, 1]
+    n = len(phones) * 2 + 1
+    inputs = [
+        get_text_from_phonemes(phones, tones, word2ph, "EN", hps, "cpu", ja_bert=torch.randn(768, n)),
+        get_text_from_phonemes(phones[:3], tones[:3], [1, 2], "EN", hps, "cpu", ja_bert=torch.randn(768, 7)),
+    ]
+    path = str(tmp_path / "shard-000000.npz")
+    write_shard(path, ["a", "b"], ["hello", "hi"], inputs, "EN", hps)
+
+    meta, loaded = read_shard(path, symbols=symbols)
+    assert meta["ids"] == ["a", "b"] and meta["bert_stream"] == "ja_bert"
+    for expected, actual in zip(inputs, loaded):
+        assert actual[0] is None
+        torch.testing.assert_close(actual[1], expected[1], atol=1e-2, rtol=1e-2)
+        for e, a in zip(expected[2:], actual[2:]):
+            assert torch.equal(e, a)
@@ -0,0 +1,22 @@
+import torch
+
+from meloplus.commons import clip_grad_value_
+
+
+def test_clip_grad_value_matches_reference():
+    torch.manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape)) for shape in [(3, 4), (7, ), (2, 2, 5)]]
+    params.append(torch.nn.Parameter(torch.randn(3)))  # no gradient
+    for p in params[:3]:
+        p.grad = torch.randn_like(p) * 3
+    expected_norm = sum(p.grad.norm(2).item()**2 for p in params[:3])**0.5
+    expected_grads = [p.grad.clamp(-1.0, 1.0) for p in params[:3]]
+
+    total_norm = clip_grad_value_(params, 1.0)
+    assert abs(total_norm - expected_norm) < 1e-5
+    for p, g in zip(params, expected_grads):
+        assert torch.equal(p.grad, g)
+
+    clipped_norm = clip_grad_value_(params, None, as_tensor=True)
+    assert isinstance(clipped_norm, torch.Tensor)
+    assert abs(clipped_norm.item() - sum(g.norm(2).item()**2 for g in expected_grads)**0.5) < 1e-5
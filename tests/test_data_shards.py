@@ -0,0 +1,40 @@
+import torch
+
+from meloplus.data_shards import ShardedTextAudioSpeakerLoader, write_shard
+from meloplus.utils import HParams
+
+
+def _item(n, frames, zh=False):
+    bert = torch.randn(1024, n) if zh else torch.zeros(1024, n)
+    ja_bert = torch.zeros(768, n) if zh else torch.randn(768, n)
+    wav = torch.rand(1, frames * 256) * 2 - 1
+    return (
+        torch.randint(1, 100, (n, )), torch.rand(513, frames), wav, torch.LongTensor([3]),
+        torch.randint(0, 10, (n, )), torch.ones(n, dtype=torch.long), bert, ja_bert)
+
+
+def test_shard_round_trip(tmp_path):
+    hparams = HParams(
+        sampling_rate=44100,
+        filter_length=1024,
+        hop_length=256,
+        win_length=1024,
+        add_blank=True,
+        max_wav_value=32768.0)
+    items = [_item(11, 40), _item(7, 25, zh=True), _item(15, 60)]
+    write_shard(str(tmp_path / "shard-00000"), iter(items), hparams)
+
+    dataset = ShardedTextAudioSpeakerLoader(str(tmp_path), hparams)
+    assert len(dataset) == 3 and dataset.lengths == [40, 25, 60]
+    for expected, actual in zip(items, dataset):
+        for i in [0, 3, 4, 5]:
+            assert torch.equal(expected[i], actual[i])
+        # int16 audio is returned as stored
+        torch.testing.assert_close(actual[2].float() / 32768.0, expected[2], atol=2e-5, rtol=0)
+        for i in [1, 6, 7]:
+            if not expected[i].any():
+                # streams without features are not stored
+                assert actual[i] is None
+                continue
+            assert expected[i].shape == actual[i].shape
+            torch.testing.assert_close(actual[i].float(), expected[i], atol=2e-3, rtol=2e-3)
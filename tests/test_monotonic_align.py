@@ -0,0 +1,19 @@
+import pytest
+import torch
+
+from meloplus.monotonic_align import maximum_path
+
+
+@pytest.mark.parametrize("impl", ["numba_parallel", "torch"])
+def test_maximum_path_matches_numba(impl):
+    torch.manual_seed(0)
+    t_ys, t_xs = [50, 31, 12, 7], [20, 31, 5, 7]
+    neg_cent = torch.randn(len(t_ys), max(t_ys), max(t_xs))
+    mask = torch.zeros_like(neg_cent)
+    for i, (t_y, t_x) in enumerate(zip(t_ys, t_xs)):
+        mask[i, :t_y, :t_x] = 1
+
+    expected = maximum_path(neg_cent, mask)
+    assert torch.equal(maximum_path(neg_cent, mask, impl=impl), expected)
+    # every frame is aligned to exactly one text position
+    assert torch.equal(expected.sum(2), mask[:, :, 0])
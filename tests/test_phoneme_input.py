@@ -0,0 +1,44 @@
+import pytest
+import torch
+
+from meloplus import commons
+from meloplus.utils import HParams, get_text_from_phonemes
+
+PHONES = ["_", "h", "ah", "l", "ow", "_"]
+TONES = [0, 0, 2, 0, 1, 0]
+WORD2PH = [1, 4, 1]
+
+
+def _hps(add_blank=True):
+    return HParams(data={"add_blank": add_blank, "disable_bert": True})
+
+
+def test_intersperse_tensor_matches_list():
+    x = torch.arange(1, 6)
+    assert commons.intersperse_tensor(x, 0).tolist() == commons.intersperse(x.tolist(), 0)
+
+
+@pytest.mark.parametrize("add_blank", [False, True])
+def test_phoneme_input_shapes(add_blank):
+    bert, ja_bert, phone, tone, language = get_text_from_phonemes(
+        PHONES, TONES, WORD2PH, "EN", _hps(add_blank), "cpu")
+    n = len(PHONES) * 2 + 1 if add_blank else len(PHONES)
+    assert phone.shape == tone.shape == language.shape == (n, )
+    # disabled BERT: both streams are absent
+    assert bert is None and ja_bert is None
+
+
+def test_precomputed_bert_is_used():
+    n = len(PHONES) * 2 + 1
+    ja_bert = torch.randn(768, n)
+    bert, out, _, _, _ = get_text_from_phonemes(PHONES, TONES, WORD2PH, "EN", _hps(), "cpu", ja_bert=ja_bert)
+    assert bert is None and torch.equal(out, ja_bert)
+
+
+def test_invalid_phoneme_input():
+    with pytest.raises(ValueError, match="Unknown phone"):
+        get_text_from_phonemes(PHONES + ["not-a-phone"], TONES + [0], WORD2PH + [1], "EN", _hps(), "cpu")
+    with pytest.raises(ValueError, match="Mismatched"):
+        get_text_from_phonemes(PHONES, TONES, [1, 4], "EN", _hps(), "cpu")
+    with pytest.raises(ValueError, match="Bert seq len"):
+        get_text_from_phonemes(PHONES, TONES, WORD2PH, "EN", _hps(), "cpu", bert=torch.zeros(1024, 3))
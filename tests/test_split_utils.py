@@ -0,0 +1,36 @@
+import io
+
+from meloplus.split_utils import iter_sentences, pack_pieces, split_sentence
+
+
+def _counter(calls):
+
+    def count_phones(text):
+        calls.append(text)
+        return len(text.replace(' ', ''))
+
+    return count_phones
+
+
+def test_pack_pieces_spaceless_language():
+    calls = []
+    pieces = ["好的我来给你讲一个故事吧从前有一个小姑娘她叫做小红", "好。", "对。"]
+    packed = pack_pieces(pieces, _counter(calls), target_phones=8, language_str='ZH')
+    # over-budget pieces are halved and short ones merged without inserting spaces
+    assert packed == ["好的我来给你讲一个故事吧", "从前有一个小姑娘她叫做小红", "好。对。"]
+    assert len(calls) == len(set(calls))
+
+
+def test_pack_pieces_latin():
+    packed = pack_pieces(["hello there my friend, how are you doing today", "ok."],
+                         _counter([]),
+                         target_phones=10)
+    assert packed == ["hello there my friend,", "how are you doing today", "ok."]
+
+
+def test_iter_sentences_matches_split_sentence():
+    text = "今天天气很好我们出去玩吧。我想去公园看看花和小鸟！明天可能会下雨所以要带伞。"
+    expected = split_sentence(text, language_str='ZH')
+    # with 20-character chunks the second sentence crosses a chunk boundary
+    assert list(iter_sentences(text, language_str='ZH', chunk_size=20)) == expected
+    assert list(iter_sentences(io.StringIO(text), language_str='ZH', chunk_size=20)) == expected
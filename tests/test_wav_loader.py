@@ -0,0 +1,48 @@
+import os
+import wave
+
+import numpy as np
+import pytest
+
+from meloplus.utils import length_index_path, load_length_index, load_wav_to_torch_fast, read_wav_header
+
+
+def _write_pcm16(path, samples, sampling_rate):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(samples.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(sampling_rate)
+        f.writeframes(samples.astype("<i2").tobytes())
+
+
+@pytest.mark.parametrize("channels", [1, 2])
+def test_fast_loader_matches_pcm(tmp_path, channels):
+    samples = np.random.randint(-32768, 32767, size=(1000, channels))
+    path = tmp_path / "a.wav"
+    _write_pcm16(path, samples, 44100)
+
+    assert read_wav_header(str(path))[:4] == (1, channels, 44100, 16)
+    audio, sampling_rate = load_wav_to_torch_fast(str(path), 44100)
+    assert sampling_rate == 44100
+    expected = (samples / 32768).mean(axis=1).astype(np.float32)
+    np.testing.assert_allclose(audio.numpy(), expected, atol=1e-6)
+
+
+def test_length_index(tmp_path):
+    path = tmp_path / "a.wav"
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(3)
+        f.setframerate(22050)
+        f.writeframes(b"\0" * (6 * 1000))
+    filelist = tmp_path / "list.txt"
+    filelist.write_text(f"{path}|spk|EN|hi\n")
+
+    # 24-bit stereo at 22050 Hz, loaded at 44100 Hz
+    assert load_length_index(str(filelist), [str(path)], 44100, 256) == [2000 // 256]
+    assert os.path.exists(length_index_path(str(filelist)))
+    # cached lengths are used while the filelist is unchanged
+    path.unlink()
+    assert load_length_index(str(filelist), [str(path)], 44100, 256) == [2000 // 256]
+    with pytest.raises(FileNotFoundError):
+        load_length_index(str(filelist), [str(path)], 44100, 256, check_files=True)